@@ -1,10 +1,15 @@
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Optional
+import functools
 import json
 import re
 from datetime import datetime
 from dataclasses import dataclass
 from enum import Enum
 
+from multi_agent_system.utils.analysis_cache import AnalysisCache, content_digest
+from multi_agent_system.utils.keyword_patterns import CASE_FOLD_TRANSLATION, KeywordPattern, has_case_fold_exceptions
+from multi_agent_system.utils.process_pool import FrozenSlotsPickling, map_in_processes
+
 class FormatType(Enum):
     EMAIL = "email"
     JSON = "json"
@@ -21,13 +26,42 @@ class IntentType(Enum):
     TRANSACTION_DATA = "transaction_data" # For generic JSON data
     UNKNOWN = "unknown"
 
-@dataclass
-class ClassificationResult:
+@dataclass(frozen=True)
+class ClassificationResult(FrozenSlotsPickling):
+    # Slotted and immutable: no per-instance __dict__, and results can be hashed and shared between callers
+    __slots__ = ('format_type', 'intent', 'confidence', 'reasoning')
+
     format_type: FormatType
     intent: IntentType
     confidence: float
     reasoning: str
 
+# Email headers (From/To with an address, Subject with a value), scored more heavily than body keywords
+# in classify_format. One findall over the start of the message reports every header name present; the
+# lookahead keeps matches zero-width so a Subject value running onto the next line can't swallow that header.
+_EMAIL_HEADER_RE = re.compile(r'^(?=(from|to)\s*:\s*[\w\.-]+@[\w\.-]+|(subject)\s*:\s*.+)', re.IGNORECASE | re.MULTILINE)
+# Headers sit at the top of a message, so only this many leading characters are searched for them
+_EMAIL_HEADER_WINDOW = 2048
+# Header score of From + To + Subject, enough to call a message an email without scoring anything else
+_DECISIVE_EMAIL_HEADER_SCORE = 6
+
+# IntentType members in declaration order, and each member's position in that list
+_INTENTS = list(IntentType)
+_INTENT_INDEX = {intent: index for index, intent in enumerate(_INTENTS)}
+
+# Name of the agent each format is routed to, built once rather than formatted per call
+_AGENT_NAME_BY_FORMAT = {format_type: f"{format_type.value}_agent" for format_type in FormatType}
+
+def _lower_for_matching(content: str) -> str:
+    """
+    Stripped, lowercased content for the case-sensitive keyword patterns. Dotless 'ı' and long 'ſ' survive
+    lower() but used to match 'i' and 's' under re.IGNORECASE, so they are folded to those letters.
+    """
+    content_lower = content.lower().strip()
+    if has_case_fold_exceptions(content_lower):
+        content_lower = content_lower.translate(CASE_FOLD_TRANSLATION)
+    return content_lower
+
 class ClassifierAgent:
     """
     Classifier Agent that detects format and business intent using
@@ -38,21 +72,24 @@ class ClassifierAgent:
         self.name = "classifier_agent"
         self.format_patterns = self._load_format_patterns()
         self.intent_keywords = self._load_intent_keywords()
+        # Results by (content digest, filename)
+        self._classify_cache = AnalysisCache()
         # self.few_shot_examples = self._load_few_shot_examples() # Present but not directly used in this rule-based version
     
-    def _load_format_patterns(self) -> Dict[FormatType, List[str]]:
-        """Load patterns to identify different formats"""
-        return {
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _load_format_patterns() -> Dict[FormatType, List[KeywordPattern]]:
+        """
+        Load patterns to identify different formats, compiled once per process and shared by all agents.
+        Like the intent keywords they only run against _lower_for_matching() content, so they skip re.IGNORECASE.
+        """
+        patterns = {
             FormatType.EMAIL: [
                 r'^from\s*:\s*[\w\.-]+@[\w\.-]+',
                 r'^to\s*:\s*[\w\.-]+@[\w\.-]+',
                 r'^subject\s*:\s*.+',
                 r'\b(dear|sincerely|best regards|yours truly)\b'
             ],
-            FormatType.JSON: [
-                r'^\s*\{.*\}\s*$', # Starts with { and ends with }
-                r'^\s*\[.*\]\s*$'  # Starts with [ and ends with ]
-            ],
             FormatType.PDF: [ # Patterns for text that looks like it came from a PDF document
                 r'\binvoice\s*#',
                 r'\b(bill\s+to|ship\s+to)\s*:',
@@ -64,10 +101,16 @@ class ClassifierAgent:
                 r'effective\s+date\s*:'
             ]
         }
+        return {fmt: [KeywordPattern(p, re.MULTILINE) for p in pats] for fmt, pats in patterns.items()}
     
-    def _load_intent_keywords(self) -> Dict[IntentType, List[str]]:
-        """Load keywords that indicate different business intents"""
-        return {
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _load_intent_keywords() -> Dict[IntentType, List[KeywordPattern]]:
+        """
+        Load keywords that indicate different business intents, compiled once per process and shared by all agents.
+        Patterns are lowercase and only ever run against _lower_for_matching() content, so they skip re.IGNORECASE.
+        """
+        keywords = {
             IntentType.RFQ: [r'\b(request\s+for\s+quotation|rfq|quote|proposal|pricing)\b'],
             IntentType.COMPLAINT: [r'\b(complaint|dissatisfied|unhappy|poor\s+service|issue|problem|escalate|refund)\b', r'\b(terrible|awful|furious|bad\s+experience)\b'],
             IntentType.INVOICE: [r'\b(invoice|bill|payment\s+due|statement\s+of\s+account)\b', r'invoice\s*#'],
@@ -76,6 +119,7 @@ class ClassifierAgent:
             IntentType.TRANSACTION_DATA: [r'"transaction_id":', r'"amount":', r'"user_id":', r'"order_id":'],
             IntentType.GENERAL_QUERY: [r'\b(how\s+to|what\s+is|can\s+you|information|details|question)\b'],
         }
+        return {intent: [KeywordPattern(p) for p in pats] for intent, pats in keywords.items()}
     
     # def _load_few_shot_examples(self) -> List[Dict[str, Any]]:
     #     # This would be used if a more advanced classification (e.g., LLM-based) was implemented
@@ -85,40 +129,37 @@ class ClassifierAgent:
     #         {"text": "Our company privacy policy has been updated...", "format": FormatType.PDF, "intent": IntentType.REGULATION}, # Assuming text from a PDF
     #     ]
 
-    def classify_format(self, content: str) -> Tuple[FormatType, float]:
-        content_lower = content.lower().strip()
+    def classify_format(self, content: str, content_lower: Optional[str] = None) -> Tuple[FormatType, float]:
+        if content_lower is None:
+            content_lower = _lower_for_matching(content)
 
         if not content_lower:
             return FormatType.UNKNOWN, 0.0
 
-        # 1. JSON detection (high confidence if structure matches)
-        if content_lower.startswith('{') and content_lower.endswith('}'):
+        # 1. JSON detection (high confidence if structure matches). Content is already stripped,
+        # so comparing the outer characters replaces the old whole-document bracket regexes.
+        if (content_lower[0], content_lower[-1]) in (('{', '}'), ('[', ']')):
             try:
                 json.loads(content)
-                return FormatType.JSON, 1.0 # Valid JSON
+                return FormatType.JSON, 1.0 # Valid JSON object or array
             except json.JSONDecodeError:
                 return FormatType.JSON, 0.7 # Looks like JSON but invalid
-        if content_lower.startswith('[') and content_lower.endswith(']'):
-            try:
-                json.loads(content)
-                return FormatType.JSON, 1.0 # Valid JSON array
-            except json.JSONDecodeError:
-                return FormatType.JSON, 0.7 # Looks like JSON array but invalid
 
-        # 2. Score PDF-like and Email content
+        # 2. Email headers are strong indicators. From, To and Subject together settle it without the PDF sweep.
+        headers_found = {(address_header or subject_header).lower() for address_header, subject_header in _EMAIL_HEADER_RE.findall(content[:_EMAIL_HEADER_WINDOW])}
+        email_score = 2 * len(headers_found)
+        if email_score >= _DECISIVE_EMAIL_HEADER_SCORE:
+            return FormatType.EMAIL, 1.0
+
+        # 3. Score PDF-like and Email body content
         pdf_score = 0
         for pattern in self.format_patterns[FormatType.PDF]:
-            if re.search(pattern, content_lower, re.IGNORECASE | re.MULTILINE):
+            if pattern.matches(content_lower):
                 pdf_score += 1
         
-        email_score = 0
-        # Email headers are strong indicators
-        if re.search(r'^from\s*:\s*[\w\.-]+@[\w\.-]+', content, re.IGNORECASE | re.MULTILINE): email_score += 2
-        if re.search(r'^to\s*:\s*[\w\.-]+@[\w\.-]+', content, re.IGNORECASE | re.MULTILINE): email_score += 2
-        if re.search(r'^subject\s*:\s*.+', content, re.IGNORECASE | re.MULTILINE): email_score += 2
         # Email body keywords
         for pattern in self.format_patterns[FormatType.EMAIL]:
-             if re.search(pattern, content_lower, re.IGNORECASE | re.MULTILINE):
+             if pattern.matches(content_lower):
                 email_score += 0.5 # Body keywords are weaker than headers
 
         # Decision Logic
@@ -133,87 +174,127 @@ class ClassifierAgent:
 
         return FormatType.UNKNOWN, 0.0
     
-    def classify_intent(self, content: str, classified_format: FormatType) -> Tuple[IntentType, float]:
-        content_lower = content.lower().strip()
-        intent_scores: Dict[IntentType, float] = {intent: 0.0 for intent in IntentType}
+    def classify_intent(self, content: str, classified_format: FormatType, content_lower: Optional[str] = None) -> Tuple[IntentType, float]:
+        if content_lower is None:
+            content_lower = _lower_for_matching(content)
+        # Scores live in a list indexed like _INTENTS, avoiding a per-call dict of every intent
+        scores = [0.0] * len(_INTENTS)
         
         if not content_lower:
             return IntentType.UNKNOWN, 0.0
 
+        # Patterns whose keywords don't occur at all are skipped before reaching the regex engine
+        any_matched = False
         for intent, patterns in self.intent_keywords.items():
+            index = _INTENT_INDEX[intent]
             for pattern in patterns:
-                if re.search(pattern, content_lower, re.IGNORECASE):
-                    intent_scores[intent] += 1
+                if pattern.matches(content_lower):
+                    scores[index] += 1
+                    any_matched = True
         
         # Adjust scores based on format
         if classified_format == FormatType.JSON:
-            if intent_scores.get(IntentType.TRANSACTION_DATA, 0) > 0 or intent_scores.get(IntentType.FRAUD_RISK, 0) > 0:
+            transaction, fraud = _INTENT_INDEX[IntentType.TRANSACTION_DATA], _INTENT_INDEX[IntentType.FRAUD_RISK]
+            if scores[transaction] > 0 or scores[fraud] > 0:
                  # Prioritize these for JSON
-                if intent_scores.get(IntentType.TRANSACTION_DATA, 0) >= intent_scores.get(IntentType.FRAUD_RISK, 0):
-                    intent_scores[IntentType.TRANSACTION_DATA] += 1
+                if scores[transaction] >= scores[fraud]:
+                    scores[transaction] += 1
                 else:
-                    intent_scores[IntentType.FRAUD_RISK] +=1
-            elif not any(score > 0 for score in intent_scores.values()): # If no other intent, default to transaction
-                intent_scores[IntentType.TRANSACTION_DATA] = 1
+                    scores[fraud] +=1
+            elif not any_matched: # If no other intent, default to transaction
+                scores[transaction] = 1
+                any_matched = True
 
 
         if classified_format == FormatType.PDF:
-            if intent_scores.get(IntentType.INVOICE, 0) > 0 or intent_scores.get(IntentType.REGULATION, 0) > 0:
+            invoice, regulation = _INTENT_INDEX[IntentType.INVOICE], _INTENT_INDEX[IntentType.REGULATION]
+            if scores[invoice] > 0 or scores[regulation] > 0:
                 # Prioritize these for PDF
-                if intent_scores.get(IntentType.INVOICE, 0) >= intent_scores.get(IntentType.REGULATION, 0):
-                     intent_scores[IntentType.INVOICE] +=1
+                if scores[invoice] >= scores[regulation]:
+                     scores[invoice] +=1
                 else:
-                    intent_scores[IntentType.REGULATION] +=1
-            elif not any(score > 0 for score in intent_scores.values()): # Default for PDF if nothing else matches
-                intent_scores[IntentType.REGULATION] = 1
+                    scores[regulation] +=1
+            elif not any_matched: # Default for PDF if nothing else matches
+                scores[regulation] = 1
+                any_matched = True
 
 
         if classified_format == FormatType.EMAIL:
             # For emails, complaint, RFQ, or general query are common
-            if not any(score > 0 for score in intent_scores.values()):
-                intent_scores[IntentType.GENERAL_QUERY] = 1
+            if not any_matched:
+                scores[_INTENT_INDEX[IntentType.GENERAL_QUERY]] = 1
+                any_matched = True
 
 
-        best_intent = IntentType.UNKNOWN
-        max_score = 0.0
-        if any(score > 0 for score in intent_scores.values()):
-            # Sort by score, then alphabetically for tie-breaking (less important here)
-            sorted_intents = sorted(intent_scores.items(), key=lambda item: item[1], reverse=True)
-            best_intent = sorted_intents[0][0]
-            max_score = sorted_intents[0][1]
+        if any_matched:
+            # list.index finds the first maximum, so ties go to the intent declared first, as with the old stable sort
+            max_score = max(scores)
+            best_intent = _INTENTS[scores.index(max_score)]
             # Basic confidence, can be improved
             confidence = min(max_score / 3.0, 1.0) if max_score > 0 else 0.0
             return best_intent, confidence
 
         return IntentType.UNKNOWN, 0.0
 
+    def _verify_format(self, content: str, content_lower: str, format_type: FormatType) -> float:
+        """
+        Cheap check of the format implied by a filename extension, instead of the full pattern sweep.
+        Returns 0.0 when the content doesn't back it up and classify_format should decide.
+        """
+        if not content_lower:
+            return 0.0
+        if format_type == FormatType.JSON:
+            try:
+                json.loads(content)
+                return 1.0 # Valid JSON
+            except json.JSONDecodeError:
+                return 0.0
+        return 0.9
+
     def classify(self, content: str, filename: str = None) -> ClassificationResult:
         """
         Main classification method that determines both format and intent
         """
-        # Try to infer format from filename extension if content classification is weak
+        return self._classify_cached(content, filename)
+
+    def _classify_cached(self, content: str, filename: Optional[str]) -> ClassificationResult:
+        return self._classify_cache.get_or_compute((content_digest(content), filename), self._classify, content, filename)
+
+    def _classify(self, content: str, filename: str) -> ClassificationResult:
+        # Infer format from filename extension; all but .txt are trusted without content analysis
         file_format_from_ext = FormatType.UNKNOWN
+        extension_is_authoritative = False
         if filename:
-            if filename.lower().endswith(".json"):
+            filename_lower = filename.lower()
+            if filename_lower.endswith(".json"):
                 file_format_from_ext = FormatType.JSON
-            elif filename.lower().endswith(".eml") or filename.lower().endswith(".msg"):
+            elif filename_lower.endswith(".eml") or filename_lower.endswith(".msg"):
                 file_format_from_ext = FormatType.EMAIL
-            elif filename.lower().endswith(".pdf") or filename.lower().endswith(".txt"): # Treat .txt as potential PDF content
+            elif filename_lower.endswith(".pdf") or filename_lower.endswith(".txt"): # Treat .txt as potential PDF content
                 file_format_from_ext = FormatType.PDF
+            extension_is_authoritative = file_format_from_ext != FormatType.UNKNOWN and not filename_lower.endswith(".txt")
 
-        format_type, format_confidence = self.classify_format(content)
+        # Lowercase once and share it between both classifiers
+        content_lower = _lower_for_matching(content)
 
-        # If content-based classification is UNKNOWN or low confidence, and filename suggests a format, use it.
-        if (format_type == FormatType.UNKNOWN or format_confidence < 0.5) and file_format_from_ext != FormatType.UNKNOWN:
+        format_confidence = self._verify_format(content, content_lower, file_format_from_ext) if extension_is_authoritative else 0.0
+        if format_confidence > 0:
             final_format_type = file_format_from_ext
-            format_reasoning = f"Format inferred from filename '{filename}' as {final_format_type.value} (content analysis was {format_type.value} with conf {format_confidence:.2f})."
-            format_confidence = 0.7 # Assign a moderate confidence for filename-based
+            format_reasoning = f"Format taken from filename '{filename}' as {final_format_type.value} (confidence: {format_confidence:.2f})."
         else:
-            final_format_type = format_type
-            format_reasoning = f"Format detected from content as {final_format_type.value} (confidence: {format_confidence:.2f})."
+            format_type, format_confidence = self.classify_format(content, content_lower)
+
+            # If content-based classification is UNKNOWN or low confidence, and filename suggests a format, use it.
+            if (format_type == FormatType.UNKNOWN or format_confidence < 0.5) and file_format_from_ext != FormatType.UNKNOWN:
+                final_format_type = file_format_from_ext
+                format_reasoning = f"Format inferred from filename '{filename}' as {final_format_type.value} (content analysis was {format_type.value} with conf {format_confidence:.2f})."
+                format_confidence = 0.7 # Assign a moderate confidence for filename-based
+            else:
+                final_format_type = format_type
+                format_reasoning = f"Format detected from content as {final_format_type.value} (confidence: {format_confidence:.2f})."
 
 
-        intent, intent_confidence = self.classify_intent(content, final_format_type)
+        intent, intent_confidence = self.classify_intent(content, final_format_type, content_lower)
         intent_reasoning = f"Intent detected as {intent.value} (confidence: {intent_confidence:.2f} based on format {final_format_type.value})."
 
         overall_confidence = (format_confidence + intent_confidence) / 2
@@ -227,6 +308,14 @@ class ClassifierAgent:
             reasoning=reasoning
         )
     
+    def classify_batch(self, documents: List[Tuple[str, Optional[str]]]) -> List[ClassificationResult]:
+        """
+        Classify (content, filename) pairs handed in together, e.g. an incoming-mail batch.
+        Duplicates within and across batches are answered from the classify() cache.
+        """
+        classify = self._classify_cached
+        return [classify(content, filename) for content, filename in documents]
+
     def get_routing_metadata(self, classification: ClassificationResult) -> Dict[str, Any]:
         """Generate routing metadata for other agents"""
         return {
@@ -236,9 +325,21 @@ class ClassifierAgent:
             "confidence": classification.confidence,
             "reasoning": classification.reasoning,
             "timestamp": datetime.now().isoformat(),
-            "route_to_agent": f"{classification.format_type.value}_agent"
+            "route_to_agent": _AGENT_NAME_BY_FORMAT[classification.format_type]
         }
 
+def _classify_document(agent: ClassifierAgent, document: Tuple[str, Optional[str]]) -> ClassificationResult:
+    content, filename = document
+    return agent.classify(content, filename)
+
+def classify_many(documents: List[Tuple[str, Optional[str]]], workers: Optional[int] = None, chunksize: int = 32) -> List[ClassificationResult]:
+    """
+    Classify a large corpus of (content, filename) pairs across worker processes (default: one per CPU).
+    Each worker builds its ClassifierAgent once; for small batches use ClassifierAgent.classify_batch,
+    which avoids the process start-up and pickling costs.
+    """
+    return map_in_processes(ClassifierAgent, _classify_document, documents, workers=workers, chunksize=chunksize)
+
 # Example usage and testing
 if __name__ == "__main__":
     classifier = ClassifierAgent()
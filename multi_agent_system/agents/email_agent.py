@@ -1,7 +1,14 @@
+import heapq
 import re
+from operator import itemgetter
 from enum import Enum
-from typing import Dict, Any, List, Tuple
-from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+from collections import Counter
+
+from multi_agent_system.utils.analysis_cache import AnalysisCache, content_digest
+from multi_agent_system.utils.keyword_patterns import WordAlternation, count_words
+from multi_agent_system.utils.process_pool import FrozenSlotsPickling, map_in_processes
 
 class ToneType(Enum):
     NEUTRAL = "neutral"
@@ -18,8 +25,25 @@ class EmailActionType(Enum):
     LOG_AND_ACKNOWLEDGE = "log_and_acknowledge"
     FLAG_FOR_REVIEW = "flag_for_review"
 
-@dataclass
-class EmailAnalysis:
+# Header patterns, compiled once for every email processed. One pass reports From/To/Subject lines; the
+# lookahead keeps matches zero-width so a value running onto the next line can't hide that line's header.
+_HEADER_RE = re.compile(r"^(?=(From|To|Subject):\s*(.+))", re.IGNORECASE | re.MULTILINE)
+_HEADER_FIELDS = {"from": "sender", "to": "recipient", "subject": "subject"}
+# Whole header lines only, so stripping them all in one pass leaves the same text as one pass per header
+_HEADER_LINE_RE = re.compile(r"^(?:From|To|Subject|Date):.*\n?", re.IGNORECASE | re.MULTILINE)
+
+# Order in which tones win when several are present, most severe first
+_TONE_PRIORITY = (ToneType.THREATENING, ToneType.ANGRY, ToneType.URGENT_NEGATIVE, ToneType.URGENT_POSITIVE, ToneType.POLITE)
+
+# Common words left out of extracted keywords
+_STOPWORDS = frozenset(["the", "a", "is", "to", "of", "and", "in", "it", "you", "for", "on", "with", "this", "that", "i", "me", "my", "we", "our", "not", "be", "at", "or", "as", "do", "if", "so", "me", "am"])
+
+@dataclass(frozen=True)
+class EmailAnalysis(FrozenSlotsPickling):
+    # Slotted and immutable: no per-instance __dict__
+    __slots__ = ('sender', 'recipient', 'subject', 'body_preview', 'keywords', 'tone', 'urgency_score',
+                 'sentiment_score', 'requires_escalation', 'suggested_action')
+
     sender: str
     recipient: str # Assuming a single primary recipient for simplicity
     subject: str
@@ -51,83 +75,78 @@ class EmailAgent:
             "positive": [r'\b(good|great|excellent|happy|satisfied|pleased|wonderful|thanks|appreciate)\b'],
             "negative": [r'\b(bad|poor|terrible|awful|sad|angry|unhappy|issue|problem|complaint|concern|error)\b']
         }
+        # Compile once per agent; the analyzers run them against lowercased text. Plain keywords are
+        # answered from one shared word count, leaving only multi-word phrases to the regex engine.
+        for keyword_table in (self.TONE_KEYWORDS, self.URGENCY_KEYWORDS, self.SENTIMENT_KEYWORDS):
+            for key, patterns in keyword_table.items():
+                keyword_table[key] = [WordAlternation(p) for p in patterns]
+        self._urgency_levels = sorted(self.URGENCY_KEYWORDS.items(), key=itemgetter(0), reverse=True)
+        # Analyses by message digest, for duplicates, auto-replies and mail waves
+        self._analysis_cache = AnalysisCache()
 
     def _parse_email_headers(self, email_content: str) -> Dict[str, str]:
         headers = {}
-        # Simple regex for common headers, assumes headers are at the beginning
-        if match := re.search(r"^From:\s*(.+)", email_content, re.IGNORECASE | re.MULTILINE):
-            headers["sender"] = match.group(1).strip()
-        if match := re.search(r"^To:\s*(.+)", email_content, re.IGNORECASE | re.MULTILINE):
-            headers["recipient"] = match.group(1).strip()
-        if match := re.search(r"^Subject:\s*(.+)", email_content, re.IGNORECASE | re.MULTILINE):
-            headers["subject"] = match.group(1).strip()
+        # Simple regex for common headers, assumes headers are at the beginning; the first line of each wins
+        for match in _HEADER_RE.finditer(email_content):
+            field = _HEADER_FIELDS[match.group(1).lower()]
+            if field not in headers:
+                headers[field] = match.group(2).strip()
+                if len(headers) == len(_HEADER_FIELDS):
+                    break
         return headers
 
     def _extract_body(self, email_content: str) -> str:
         # Simple body extraction: assumes body starts after the first double newline
         # or after all known headers. This is a simplification.
-        match = re.search(r"\n\n(.*)", email_content, re.DOTALL)
-        if match:
-            return match.group(1).strip()
+        body_start = email_content.find("\n\n")
+        if body_start != -1:
+            return email_content[body_start + 2:].strip()
         
         # Fallback: try to remove common headers
-        body_candidate = email_content
-        for header_pattern in [r"^From:.*\n?", r"^To:.*\n?", r"^Subject:.*\n?", r"^Date:.*\n?"]:
-            body_candidate = re.sub(header_pattern, "", body_candidate, flags=re.IGNORECASE | re.MULTILINE)
-        return body_candidate.strip()
-
-    def _extract_keywords(self, text: str, max_keywords: int = 10) -> List[str]:
-        text_lower = text.lower()
-        # Simple keyword extraction: split by non-alphanumeric, filter common words
-        words = re.findall(r'\b[a-z]{3,15}\b', text_lower) # Words 3-15 chars long
-        stopwords = set(["the", "a", "is", "to", "of", "and", "in", "it", "you", "for", "on", "with", "this", "that", "i", "me", "my", "we", "our", "not", "be", "at", "or", "as", "do", "if", "so", "me", "am"])
-        
+        return _HEADER_LINE_RE.sub("", email_content).strip()
+
+    def _extract_keywords(self, word_counts: Counter, max_keywords: int = 10) -> List[str]:
+        # Simple keyword extraction from count_words() of the lowercased text: whole a-z words 3-15 chars long
+        # (what r'\b[a-z]{3,15}\b' finds), filtering common words
         # A more advanced approach would use TF-IDF or other NLP techniques
         # For now, simple frequency count after stopword removal
-        from collections import Counter
-        filtered_words = [word for word in words if word not in stopwords]
-        if not filtered_words:
+        candidates = [(word, count) for word, count in word_counts.items()
+                      if 3 <= len(word) <= 15 and word.isascii() and word.isalpha() and word not in _STOPWORDS]
+        if not candidates:
             return []
         
-        most_common = [word for word, count in Counter(filtered_words).most_common(max_keywords)]
+        # Top-k straight from the counts, without copying them into a second Counter; ties keep first-seen order
+        most_common = [word for word, count in heapq.nlargest(max_keywords, candidates, key=itemgetter(1))]
         return most_common
 
-    def _analyze_tone(self, text: str) -> ToneType:
-        text_lower = text.lower()
-        scores = {tone: 0 for tone in ToneType}
-
-        for tone, patterns in self.TONE_KEYWORDS.items():
-            for pattern in patterns:
-                if re.search(pattern, text_lower):
-                    scores[tone] += 1
-        
-        # Prioritize more severe tones
-        if scores[ToneType.THREATENING] > 0: return ToneType.THREATENING
-        if scores[ToneType.ANGRY] > 0: return ToneType.ANGRY
-        if scores[ToneType.URGENT_NEGATIVE] > 0: return ToneType.URGENT_NEGATIVE
-        if scores[ToneType.URGENT_POSITIVE] > 0: return ToneType.URGENT_POSITIVE
-        if scores[ToneType.POLITE] > 0: return ToneType.POLITE
+    def _analyze_all(self, text_lower: str, word_counts: Counter) -> Tuple[ToneType, float, float]:
+        """Tone, urgency and sentiment of the lowercased text, given its count_words()"""
+        return (self._analyze_tone(text_lower, word_counts),
+                self._analyze_urgency(text_lower, word_counts),
+                self._analyze_sentiment(text_lower, word_counts))
+
+    def _analyze_tone(self, text_lower: str, word_counts: Counter) -> ToneType:
+        # Check the more severe tones first and stop at the first one present
+        for tone in _TONE_PRIORITY:
+            if any(pattern.found_in(text_lower, word_counts) for pattern in self.TONE_KEYWORDS[tone]):
+                return tone
         return ToneType.NEUTRAL
 
-    def _analyze_urgency(self, text: str) -> float:
-        text_lower = text.lower()
-        max_urgency = 0.1 # Default low urgency
+    def _analyze_urgency(self, text_lower: str, word_counts: Counter) -> float:
+        # Levels go from most to least urgent, so the first level with a match is the maximum
+        for score_val, patterns in self._urgency_levels:
+            if any(pattern.found_in(text_lower, word_counts) for pattern in patterns):
+                return max(score_val, 0.1)
+        return 0.1 # Default low urgency
 
-        for score_val, patterns in self.URGENCY_KEYWORDS.items():
-            for pattern in patterns:
-                if re.search(pattern, text_lower):
-                    max_urgency = max(max_urgency, score_val)
-        return max_urgency
-
-    def _analyze_sentiment(self, text: str) -> float:
-        text_lower = text.lower()
+    def _analyze_sentiment(self, text_lower: str, word_counts: Counter) -> float:
         positive_score = 0
         negative_score = 0
 
         for pattern in self.SENTIMENT_KEYWORDS["positive"]:
-            positive_score += len(re.findall(pattern, text_lower))
+            positive_score += pattern.count_in(text_lower, word_counts)
         for pattern in self.SENTIMENT_KEYWORDS["negative"]:
-            negative_score += len(re.findall(pattern, text_lower))
+            negative_score += pattern.count_in(text_lower, word_counts)
         
         if positive_score == 0 and negative_score == 0:
             return 0.0 # Neutral
@@ -167,6 +186,9 @@ class EmailAgent:
         return action, requires_escalation
 
     def process_email(self, email_content: str) -> EmailAnalysis:
+        return self._analysis_cache.get_or_compute(content_digest(email_content), self._process_email, email_content)
+
+    def _process_email(self, email_content: str) -> EmailAnalysis:
         headers = self._parse_email_headers(email_content)
         body = self._extract_body(email_content)
         
@@ -177,10 +199,12 @@ class EmailAgent:
         # Use body for primary analysis, but subject can contribute
         analysis_text = subject + " " + body
         
-        keywords = self._extract_keywords(analysis_text)
-        tone = self._analyze_tone(analysis_text)
-        urgency = self._analyze_urgency(analysis_text)
-        sentiment = self._analyze_sentiment(analysis_text)
+        # Lowercase and count words once; keywords, tone, urgency and sentiment all read from these
+        analysis_lower = analysis_text.lower()
+        word_counts = count_words(analysis_lower)
+
+        keywords = self._extract_keywords(word_counts)
+        tone, urgency, sentiment = self._analyze_all(analysis_lower, word_counts)
         
         action, escalation_needed = self._determine_action(tone, urgency, sentiment)
 
@@ -199,8 +223,26 @@ class EmailAgent:
 
     def get_extracted_fields(self, analysis_result: EmailAnalysis) -> Dict[str, Any]:
         """Converts EmailAnalysis to a dictionary for storage/response."""
-        result_dict = asdict(analysis_result)
-        # Convert enums to their string values for JSON serialization
-        result_dict["tone"] = analysis_result.tone.value
-        result_dict["suggested_action"] = analysis_result.suggested_action.value
-        return result_dict
\ No newline at end of file
+        # Built field by field rather than through asdict(), which deep-copies recursively.
+        # Enums become their string values for JSON serialization; keywords are copied so
+        # changing the returned list doesn't change the analysis.
+        return {
+            "sender": analysis_result.sender,
+            "recipient": analysis_result.recipient,
+            "subject": analysis_result.subject,
+            "body_preview": analysis_result.body_preview,
+            "keywords": list(analysis_result.keywords),
+            "tone": analysis_result.tone.value,
+            "urgency_score": analysis_result.urgency_score,
+            "sentiment_score": analysis_result.sentiment_score,
+            "requires_escalation": analysis_result.requires_escalation,
+            "suggested_action": analysis_result.suggested_action.value
+        }
+
+def process_emails(emails: List[str], workers: Optional[int] = None, chunksize: int = 32) -> List[EmailAnalysis]:
+    """
+    Analyze a large batch of emails across worker processes (default: one per CPU).
+    Each email is independent and each worker builds its EmailAgent once; for a few
+    emails call EmailAgent.process_email directly and skip the process start-up cost.
+    """
+    return map_in_processes(EmailAgent, EmailAgent.process_email, emails, workers=workers, chunksize=chunksize)
@@ -1,7 +1,17 @@
+import functools
 import json
 from enum import Enum
+from itertools import islice
 from typing import Dict, Any, List, Tuple, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+
+from multi_agent_system.utils.analysis_cache import AnalysisCache, content_digest
+from multi_agent_system.utils.process_pool import map_in_processes
+
+try:
+    import orjson
+except ImportError: # Optional: fall back to the standard library parser
+    orjson = None
 
 class JSONAnomalyType(Enum):
     SCHEMA_VIOLATION = "schema_violation" # Missing required field, wrong type
@@ -18,6 +28,11 @@ class JSONActionType(Enum):
 
 @dataclass
 class JSONAnalysis:
+    # Slotted: no per-instance __dict__. Not frozen, since frozen dataclasses pay for object.__setattr__
+    # on every field at construction and process_json builds one per call
+    __slots__ = ('is_valid_json', 'schema_validated', 'anomalies_detected', 'extracted_data_preview', 'risk_score',
+                 'suggested_action')
+
     is_valid_json: bool
     schema_validated: bool # True if passed schema checks
     anomalies_detected: List[Tuple[JSONAnomalyType, str]] # (AnomalyType, description)
@@ -25,10 +40,51 @@ class JSONAnalysis:
     risk_score: float # 0.0 to 1.0, based on anomalies
     suggested_action: JSONActionType
 
+# orjson turns integers beyond 64 bits into floats, so documents with a run of this many digits are left
+# to json. Mapping every byte to '0' or ' ' lets bytes.translate and one substring check find such runs.
+_LONG_DIGIT_RUN = b'0' * 19
+_DIGIT_MASK = bytes(0x30 if 0x30 <= byte <= 0x39 else 0x20 for byte in range(256))
+
+def _loads(json_string: str) -> Any:
+    """
+    json.loads, through orjson when it is installed. Anything orjson rejects (NaN, lone
+    surrogates, invalid input) is handed to json.loads, so the accepted documents, parsed
+    values and errors raised stay exactly those of the standard library.
+    """
+    if orjson is not None and isinstance(json_string, str):
+        try:
+            encoded = json_string.encode()
+            if _LONG_DIGIT_RUN not in encoded.translate(_DIGIT_MASK):
+                return orjson.loads(encoded)
+        except (UnicodeEncodeError, orjson.JSONDecodeError):
+            pass
+    return json.loads(json_string)
+
+# Risk each anomaly adds to a payload's score
+_ANOMALY_RISK_WEIGHTS = {
+    JSONAnomalyType.SCHEMA_VIOLATION: 0.3,
+    JSONAnomalyType.BUSINESS_RULE_VIOLATION: 0.5,
+    JSONAnomalyType.INVALID_VALUE: 0.4,
+    JSONAnomalyType.UNEXPECTED_FIELD: 0.1
+}
+
+# Anomalies with fixed wording are built once and shared; anomaly tuples are never modified
+_NEGATIVE_AMOUNT_ANOMALY = (JSONAnomalyType.INVALID_VALUE, "Transaction amount cannot be negative.")
+_HIGH_AMOUNT_ANOMALY = (JSONAnomalyType.BUSINESS_RULE_VIOLATION, "Transaction amount exceeds high value threshold ($50,000).")
+_NO_ANOMALY = (JSONAnomalyType.NONE, "No anomalies detected")
+
+# Longer payloads are analysed without caching: the preview keeps their top-level values, which can be
+# nested objects almost as large as the payload, and a deep copy of them on every hit
+_MAX_CACHED_JSON_LENGTH = 4096
+
 class JSONAgent:
     def __init__(self):
         self.name = "json_agent"
         self.business_rules = self._load_business_rules() # Load predefined schemas/rules
+        self._compiled_schemas = self._compile_schemas(self.business_rules)
+        self._allowed_flags = frozenset(self.business_rules.get("transaction_schema", {}).get("allowed_flags", []))
+        # Analyses by (payload digest, schema), for retried deliveries and heartbeat events
+        self._analysis_cache = AnalysisCache()
 
     def _load_business_rules(self) -> Dict[str, Any]:
         # Example rules, can be loaded from a config file
@@ -50,6 +106,20 @@ class JSONAgent:
             "generic_webhook_min_fields": ["event_type", "payload", "received_at"]
         }
 
+    def _compile_schema(self, schema: Dict[str, Any]) -> Tuple[tuple, frozenset, Tuple[Tuple[str, Any], ...]]:
+        """
+        (required field, anomaly reported when it is missing) pairs in order, the required fields
+        as a set, and (field, expected type) pairs of a schema
+        """
+        required_fields = tuple(schema.get("required_fields", []))
+        missing_field_anomalies = tuple((req_field, (JSONAnomalyType.SCHEMA_VIOLATION, f"Missing required field: '{req_field}'"))
+                                        for req_field in required_fields)
+        return missing_field_anomalies, frozenset(required_fields), tuple(schema.get("field_types", {}).items())
+
+    def _compile_schemas(self, business_rules: Dict[str, Any]) -> Dict[str, Tuple[tuple, frozenset, Tuple[Tuple[str, Any], ...]]]:
+        """Every schema's rules, unpacked once instead of per payload"""
+        return {schema_name: self._compile_schema(schema) for schema_name, schema in business_rules.items() if isinstance(schema, dict)}
+
     def _validate_schema(self, data: Dict[str, Any], schema_name: str = "transaction_schema") -> List[Tuple[JSONAnomalyType, str]]:
         anomalies = []
         schema = self.business_rules.get(schema_name)
@@ -57,19 +127,22 @@ class JSONAgent:
             anomalies.append((JSONAnomalyType.SCHEMA_VIOLATION, f"Schema '{schema_name}' not found."))
             return anomalies
 
-        # Check required fields
-        for req_field in schema.get("required_fields", []):
-            if req_field not in data:
-                anomalies.append((JSONAnomalyType.SCHEMA_VIOLATION, f"Missing required field: '{req_field}'"))
+        # Rules that weren't a schema dict when the agent was built are read as they are now
+        missing_field_anomalies, required_set, field_types = self._compiled_schemas.get(schema_name) or self._compile_schema(schema)
+
+        # Check required fields; a valid payload has them all, which one C-level subset test confirms
+        if not (isinstance(data, dict) and data.keys() >= required_set):
+            for req_field, missing_field_anomaly in missing_field_anomalies:
+                if req_field not in data:
+                    anomalies.append(missing_field_anomaly)
         
         # Check field types
-        field_types = schema.get("field_types", {})
-        for field, expected_type in field_types.items():
+        for field, expected_type in field_types:
             if field in data and not isinstance(data[field], expected_type):
                 anomalies.append((JSONAnomalyType.SCHEMA_VIOLATION, f"Invalid type for field '{field}'. Expected {expected_type}, got {type(data[field])}"))
 
         # Check for unexpected fields (optional, based on strictness)
-        # known_fields = set(schema.get("required_fields", [])) | set(field_types.keys())
+        # known_fields = set(required_set) | {field for field, _ in field_types}
         # for field in data.keys():
         #     if field not in known_fields:
         #         anomalies.append((JSONAnomalyType.UNEXPECTED_FIELD, f"Unexpected field: '{field}'"))
@@ -83,15 +156,19 @@ class JSONAgent:
             amount = data.get("amount")
             if isinstance(amount, (int, float)):
                 if amount < 0:
-                    anomalies.append((JSONAnomalyType.INVALID_VALUE, "Transaction amount cannot be negative."))
+                    anomalies.append(_NEGATIVE_AMOUNT_ANOMALY)
                 if amount > 50000: # Example high value threshold
-                    anomalies.append((JSONAnomalyType.BUSINESS_RULE_VIOLATION, "Transaction amount exceeds high value threshold ($50,000)."))
+                    anomalies.append(_HIGH_AMOUNT_ANOMALY)
             
             flags = data.get("flags")
             if flags and isinstance(flags, list):
-                allowed_flags = self.business_rules.get(schema_name, {}).get("allowed_flags", [])
+                allowed_flags = self._allowed_flags # Looked up once per agent, not per webhook
                 for flag_val in flags:
-                    if flag_val not in allowed_flags:
+                    try:
+                        is_allowed = flag_val in allowed_flags
+                    except TypeError: # Unhashable values (JSON arrays/objects) are compared one by one, as in a list
+                        is_allowed = any(flag_val == allowed_flag for allowed_flag in allowed_flags)
+                    if not is_allowed:
                          anomalies.append((JSONAnomalyType.INVALID_VALUE, f"Invalid flag '{flag_val}' detected in transaction."))
 
 
@@ -99,19 +176,12 @@ class JSONAgent:
         return anomalies
 
     def _calculate_risk_score(self, anomalies: List[Tuple[JSONAnomalyType, str]]) -> float:
-        score = 0.0
         if not anomalies:
-            return score
-        
+            return 0.0
+        # One weight lookup per anomaly instead of a chain of enum comparisons
+        score = 0.0
         for anomaly_type, _ in anomalies:
-            if anomaly_type == JSONAnomalyType.SCHEMA_VIOLATION:
-                score += 0.3
-            elif anomaly_type == JSONAnomalyType.BUSINESS_RULE_VIOLATION:
-                score += 0.5
-            elif anomaly_type == JSONAnomalyType.INVALID_VALUE:
-                score += 0.4
-            elif anomaly_type == JSONAnomalyType.UNEXPECTED_FIELD:
-                score += 0.1
+            score += _ANOMALY_RISK_WEIGHTS.get(anomaly_type, 0.0)
         return min(score, 1.0)
 
     def _determine_action(self, risk_score: float, anomalies: List[Tuple[JSONAnomalyType, str]]) -> JSONActionType:
@@ -124,8 +194,14 @@ class JSONAgent:
         return JSONActionType.PROCESS_NORMALLY
 
     def process_json(self, json_string: str, schema_to_validate: Optional[str] = "transaction_schema") -> JSONAnalysis:
+        if not isinstance(json_string, str) or len(json_string) > _MAX_CACHED_JSON_LENGTH:
+            return self._process_json(json_string, schema_to_validate)
+        key = (content_digest(json_string), schema_to_validate)
+        return self._analysis_cache.get_or_compute(key, self._process_json, json_string, schema_to_validate)
+
+    def _process_json(self, json_string: str, schema_to_validate: Optional[str]) -> JSONAnalysis:
         try:
-            data = json.loads(json_string)
+            data = _loads(json_string)
             is_valid_json = True
         except json.JSONDecodeError as e:
             return JSONAnalysis(
@@ -155,16 +231,17 @@ class JSONAgent:
         action = self._determine_action(risk_score, all_anomalies)
 
         # Create a preview (e.g., first 5 keys or specific important keys)
-        preview_keys = list(data.keys())[:5]
+        # islice stops after five keys instead of listing every key of a large payload
+        preview_keys = islice(data.keys(), 5)
         data_preview = {k: data[k] for k in preview_keys}
-        if len(data.keys()) > 5:
-            data_preview["..."] = f"{len(data.keys()) - 5} more fields"
+        if len(data) > 5:
+            data_preview["..."] = f"{len(data) - 5} more fields"
 
 
         return JSONAnalysis(
             is_valid_json=is_valid_json,
             schema_validated=schema_validated_successfully,
-            anomalies_detected=all_anomalies if all_anomalies else [(JSONAnomalyType.NONE, "No anomalies detected")],
+            anomalies_detected=all_anomalies if all_anomalies else [_NO_ANOMALY],
             extracted_data_preview=data_preview,
             risk_score=risk_score,
             suggested_action=action
@@ -172,11 +249,26 @@ class JSONAgent:
 
     def get_extracted_fields(self, analysis_result: JSONAnalysis) -> Dict[str, Any]:
         """Converts JSONAnalysis to a dictionary for storage/response."""
-        result_dict = asdict(analysis_result)
-        # Convert enums to their string values
-        result_dict["anomalies_detected"] = [(anomaly[0].value, anomaly[1]) for anomaly in analysis_result.anomalies_detected]
-        result_dict["suggested_action"] = analysis_result.suggested_action.value
-        return result_dict
+        # Built field by field rather than through asdict(), which deep-copies the whole parsed preview.
+        # Enums become their string values.
+        return {
+            "is_valid_json": analysis_result.is_valid_json,
+            "schema_validated": analysis_result.schema_validated,
+            "anomalies_detected": [(anomaly[0].value, anomaly[1]) for anomaly in analysis_result.anomalies_detected],
+            "extracted_data_preview": dict(analysis_result.extracted_data_preview),
+            "risk_score": analysis_result.risk_score,
+            "suggested_action": analysis_result.suggested_action.value
+        }
+
+def process_many(json_strings: List[str], schema_to_validate: Optional[str] = "transaction_schema",
+                 workers: Optional[int] = None, chunksize: int = 64) -> List[JSONAnalysis]:
+    """
+    Analyze a large batch of webhook payloads against one schema across worker processes (default: one
+    per CPU). Each worker builds its JSONAgent once; for a few payloads call JSONAgent.process_json
+    directly and skip the process start-up cost.
+    """
+    process_json = functools.partial(JSONAgent.process_json, schema_to_validate=schema_to_validate)
+    return map_in_processes(JSONAgent, process_json, json_strings, workers=workers, chunksize=chunksize)
 
 # Example usage and testing
 if __name__ == "__main__":
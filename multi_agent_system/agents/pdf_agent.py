@@ -1,9 +1,39 @@
+import functools
+import os
 import re
 from PyPDF2 import PdfReader
 from io import BytesIO
-from typing import Dict, Any, List, Tuple, Union
+from typing import Dict, Any, List, Mapping, Optional, Tuple, Union
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+
+from multi_agent_system.utils.analysis_cache import AnalysisCache, content_digest
+from multi_agent_system.utils.keyword_patterns import CASE_FOLD_TRANSLATION, KeywordPattern, has_case_fold_exceptions
+from multi_agent_system.utils.process_pool import map_in_processes
+
+try:
+    import pymupdf
+except ImportError: # Optional, and only used by agents created with use_pymupdf=True
+    try:
+        import fitz as pymupdf # Name used by PyMuPDF releases before 1.24
+    except ImportError:
+        pymupdf = None
+
+# Environment variable through which the service opts in to PyMuPDF text extraction (see PDFAgent)
+USE_PYMUPDF_ENV_VAR = "PDF_AGENT_USE_PYMUPDF"
+
+def use_pymupdf_from_env(environ: Mapping[str, str] = os.environ) -> bool:
+    """Whether USE_PYMUPDF_ENV_VAR is set to 1, true or yes"""
+    return environ.get(USE_PYMUPDF_ENV_VAR, "").strip().lower() in ("1", "true", "yes")
+
+# Policy effective date, compiled once for every document processed
+_EFFECTIVE_DATE_RE = re.compile(r'effective\s+date\s*[:\s]*(.*)', re.IGNORECASE)
+
+_ESCAPE_OR_UPPERCASE_RE = re.compile(r'\\.|[A-Z]', re.DOTALL)
+
+def _lowercase_pattern(pattern: str) -> str:
+    """`pattern` with its literal letters and character ranges lowercased, leaving escapes such as \\S alone"""
+    return _ESCAPE_OR_UPPERCASE_RE.sub(lambda m: m.group() if m.group().startswith('\\') else m.group().lower(), pattern)
 
 class PDFDocumentType(Enum):
     INVOICE = "invoice"
@@ -26,8 +56,31 @@ class PDFActionType(Enum):
     FLAG_FOR_LEGAL = "flag_for_legal_review"
     NO_ACTION = "no_action"
 
+# Keywords that identify each document type, checked in this order on the lowercased text
+_INVOICE_KEYWORDS = ("invoice", "bill to", "total due", "statement of account")
+_LINE_ITEM_KEYWORDS = ("line item", "description", "qty", "unit price")
+_POLICY_KEYWORDS = ("policy", "terms and conditions", "privacy statement", "regulation", "gdpr", "fda")
+_REPORT_KEYWORDS = ("report", "summary", "analysis", "findings")
+
+# Fields an invoice is flagged for when any is missing or empty
+_REQUIRED_INVOICE_FIELDS = ("invoice_number", "invoice_date", "total_amount", "bill_to")
+
+# Invoice fields stored as numbers when their capture parses
+_AMOUNT_FIELDS = frozenset(("total_amount", "subtotal", "tax_amount"))
+
+# Flag raised for each compliance category _detect_compliance_issues reports
+_COMPLIANCE_KEYWORD_FLAGS = (
+    ("GDPR_keyword_found", PDFFlagType.COMPLIANCE_KEYWORD_GDPR),
+    ("FDA_keyword_found", PDFFlagType.COMPLIANCE_KEYWORD_FDA),
+    ("OTHER_keyword_found", PDFFlagType.COMPLIANCE_KEYWORD_OTHER)
+)
+
 @dataclass
 class PDFAnalysis:
+    # Slotted: no per-instance __dict__ for the one result built per document
+    __slots__ = ('document_type', 'confidence', 'extracted_fields', 'compliance_keywords_found', 'flags', 'risk_score',
+                 'suggested_action', 'raw_text_preview')
+
     document_type: PDFDocumentType
     confidence: float
     extracted_fields: Dict[str, Any]
@@ -38,8 +91,15 @@ class PDFAnalysis:
     raw_text_preview: str # For brevity in logs
 
 class PDFAgent:
-    def __init__(self):
+    def __init__(self, use_pymupdf: bool = False):
         self.name = "pdf_agent"
+        # PyMuPDF extracts text faster but lays it out differently from PyPDF2, which can change
+        # analysis results for existing documents, so it has to be asked for
+        self.use_pymupdf = use_pymupdf
+        if use_pymupdf and pymupdf is None:
+            print("PyMuPDF was requested but isn't installed; extracting PDF text with PyPDF2")
+        # Analyses by content key (see _cache_key), for templated invoices and re-submitted PDFs
+        self._analysis_cache = AnalysisCache()
         self.MAX_INVOICE_AMOUNT = 10000.0
         self.COMPLIANCE_KEYWORDS = {
             "GDPR": [r'\b(gdpr|general\s+data\s+protection\s+regulation)\b'],
@@ -57,55 +117,94 @@ class PDFAgent:
             # Basic line item capture (can be complex)
             "line_items_header": [r'(description|item)\s+(quantity|qty)\s+(unit\s+price|price)\s+(amount|total)'],
         }
+        # Compile once per agent rather than going through re's pattern cache on every document. Compliance
+        # patterns run on lowercased text, behind KeywordPattern's check for their keywords.
+        for category, patterns in self.COMPLIANCE_KEYWORDS.items():
+            self.COMPLIANCE_KEYWORDS[category] = [KeywordPattern(p) for p in patterns]
+        # Invoice patterns are searched through case-sensitive twins on lowercased text, where re can use literal
+        # prefixes and skips case folding; they find the same spans as the patterns above with IGNORECASE | DOTALL
+        # on the original text (the line items header has no '.', so DOTALL doesn't change it).
+        self._invoice_patterns_lower = {field: [KeywordPattern(_lowercase_pattern(p), re.DOTALL) for p in patterns]
+                                        for field, patterns in self.INVOICE_PATTERNS.items()}
+
+    def _extract_text_with_mupdf(self, **open_kwargs) -> Optional[str]:
+        """
+        Text of every page through PyMuPDF, whose C parser is several times faster than PyPDF2, or None
+        when the agent wasn't created with use_pymupdf=True, it isn't installed or it can't read the document.
+        """
+        if not self.use_pymupdf or pymupdf is None:
+            return None
+        try:
+            with pymupdf.open(filetype="pdf", **open_kwargs) as doc:
+                return "".join([page.get_text("text") for page in doc])
+        except Exception:
+            return None
 
     def _extract_text_from_bytes(self, pdf_bytes: bytes) -> str:
-        text = ""
+        text = self._extract_text_with_mupdf(stream=pdf_bytes)
+        if text is not None:
+            return text
+        # Pages are collected and joined once instead of growing one string per page; on an error the
+        # pages read so far are still returned
+        pages_text = []
         try:
             reader = PdfReader(BytesIO(pdf_bytes))
             for page in reader.pages:
-                text += page.extract_text() or ""
+                pages_text.append(page.extract_text() or "")
         except Exception as e:
             print(f"Error extracting text from PDF bytes: {e}")
-        return text
+        return "".join(pages_text)
 
     def _extract_text_from_file(self, file_path: str) -> str:
-        text = ""
+        text = self._extract_text_with_mupdf(filename=file_path)
+        if text is not None:
+            return text
+        pages_text = []
         try:
             with open(file_path, "rb") as f:
                 reader = PdfReader(f)
                 for page in reader.pages:
-                    text += page.extract_text() or ""
+                    pages_text.append(page.extract_text() or "")
         except Exception as e:
             print(f"Error extracting text from PDF file {file_path}: {e}")
-        return text
+        return "".join(pages_text)
 
-    def _detect_document_type(self, text: str) -> Tuple[PDFDocumentType, float]:
-        text_lower = text.lower()
-        if any(keyword in text_lower for keyword in ["invoice", "bill to", "total due", "statement of account"]):
-            if any(keyword in text_lower for keyword in ["line item", "description", "qty", "unit price"]):
+    def _detect_document_type(self, text: str, text_lower: Optional[str] = None) -> Tuple[PDFDocumentType, float]:
+        if text_lower is None:
+            text_lower = text.lower()
+        if any(keyword in text_lower for keyword in _INVOICE_KEYWORDS):
+            if any(keyword in text_lower for keyword in _LINE_ITEM_KEYWORDS):
                 return PDFDocumentType.INVOICE, 0.9
             return PDFDocumentType.INVOICE, 0.7
-        if any(keyword in text_lower for keyword in ["policy", "terms and conditions", "privacy statement", "regulation", "gdpr", "fda"]):
+        if any(keyword in text_lower for keyword in _POLICY_KEYWORDS):
             return PDFDocumentType.POLICY, 0.8
-        if any(keyword in text_lower for keyword in ["report", "summary", "analysis", "findings"]):
+        if any(keyword in text_lower for keyword in _REPORT_KEYWORDS):
             return PDFDocumentType.REPORT, 0.6
         return PDFDocumentType.UNKNOWN, 0.3
 
-    def _extract_structured_data(self, text: str, doc_type: PDFDocumentType) -> Dict[str, Any]:
+    def _extract_structured_data(self, text: str, doc_type: PDFDocumentType, text_lower: Optional[str] = None) -> Dict[str, Any]:
         data: Dict[str, Any] = {"raw_text_preview": text[:500] + "..."} # Store a preview
-        text_lower_for_search = text # Keep original case for some captures if needed, but search lower
         
         if doc_type == PDFDocumentType.INVOICE:
-            for field, patterns in self.INVOICE_PATTERNS.items():
+            # Search lowercased text, but capture from the original so values keep their case. Lowercasing keeps
+            # every character at its index unless the text has one of the few case fold exceptions, which are
+            # translated to their ASCII letters first.
+            invoice_patterns = self._invoice_patterns_lower
+            if has_case_fold_exceptions(text):
+                search_text = text.translate(CASE_FOLD_TRANSLATION).lower()
+            else:
+                search_text = text.lower() if text_lower is None else text_lower
+            for field, patterns in invoice_patterns.items():
                 if field == "line_items_header": # Skip direct extraction of header
                     continue
                 for pattern in patterns:
-                    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+                    match = pattern.search(search_text)
                     if match:
-                        value = match.group(1).strip() if len(match.groups()) > 0 else match.group(0).strip()
-                        if field in ["total_amount", "subtotal", "tax_amount"]:
+                        start, end = match.span(1) if match.re.groups > 0 else match.span()
+                        value = text[start:end].strip()
+                        if field in _AMOUNT_FIELDS:
                             try:
-                                data[field] = float(value.replace(',', ''))
+                                data[field] = float(value.replace(',', '') if ',' in value else value)
                             except ValueError:
                                 data[field] = value # Store as string if conversion fails
                         else:
@@ -116,7 +215,7 @@ class PDFAgent:
             line_items = []
             # This is a placeholder for more complex line item logic
             # For simplicity, we'll just look for a few keywords if a header was found
-            if re.search(self.INVOICE_PATTERNS["line_items_header"][0], text, re.IGNORECASE):
+            if invoice_patterns["line_items_header"][0].search(search_text):
                 # Example: find lines that look like "item description qty price total"
                 # This is highly dependent on PDF structure and often requires OCR or table parsing tools for reliability
                 # For now, we'll just indicate that line items might be present
@@ -132,18 +231,19 @@ class PDFAgent:
 
         elif doc_type == PDFDocumentType.POLICY:
             data["title"] = "Policy Document" # Placeholder
-            if match := re.search(r'effective\s+date\s*[:\s]*(.*)', text, re.IGNORECASE):
+            if match := _EFFECTIVE_DATE_RE.search(text):
                 data["effective_date"] = match.group(1).strip()
             # Could extract sections, etc.
         
         return data
 
-    def _detect_compliance_issues(self, text: str) -> List[str]:
+    def _detect_compliance_issues(self, text: str, text_lower: Optional[str] = None) -> List[str]:
         found_keywords = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         for category, patterns in self.COMPLIANCE_KEYWORDS.items():
             for pattern in patterns:
-                if re.search(pattern, text_lower):
+                if pattern.matches(text_lower):
                     found_keywords.append(f"{category}_keyword_found") # More generic
                     # Or be specific:
                     # if category == "GDPR": found_keywords.append("GDPR")
@@ -158,17 +258,15 @@ class PDFAgent:
             if isinstance(total_amount, (float, int)) and total_amount > self.MAX_INVOICE_AMOUNT:
                 flags.append(PDFFlagType.HIGH_INVOICE_AMOUNT)
             # Example: Check for missing essential invoice fields
-            required_invoice_fields = ["invoice_number", "invoice_date", "total_amount", "bill_to"]
-            if not all(field in extracted_data and extracted_data[field] for field in required_invoice_fields):
+            if not all(extracted_data.get(field) for field in _REQUIRED_INVOICE_FIELDS):
                 flags.append(PDFFlagType.MISSING_REQUIRED_FIELDS)
 
 
-        if any("GDPR_keyword_found" in kw for kw in compliance_keywords):
-            flags.append(PDFFlagType.COMPLIANCE_KEYWORD_GDPR)
-        if any("FDA_keyword_found" in kw for kw in compliance_keywords):
-            flags.append(PDFFlagType.COMPLIANCE_KEYWORD_FDA)
-        if any("OTHER_keyword_found" in kw for kw in compliance_keywords):
-            flags.append(PDFFlagType.COMPLIANCE_KEYWORD_OTHER)
+        # Hashed lookups of the "<category>_keyword_found" entries instead of scanning the list once per category
+        found_keywords = set(compliance_keywords)
+        for keyword, flag in _COMPLIANCE_KEYWORD_FLAGS:
+            if keyword in found_keywords:
+                flags.append(flag)
         
         if not flags:
             flags.append(PDFFlagType.NONE)
@@ -196,6 +294,24 @@ class PDFAgent:
             return PDFActionType.ARCHIVE_DOCUMENT
         return PDFActionType.NO_ACTION
 
+    def _cache_key(self, pdf_input: Union[str, bytes], input_type: str) -> Optional[Tuple]:
+        """
+        Key identifying the document's content, or None when it can't be cached.
+        Files are keyed on path, modification time and size, so a rewritten file is processed again
+        without reading it to hash it; a file that can't be stat'ed isn't cached.
+        """
+        if input_type == "bytes":
+            return ("bytes", content_digest(pdf_input))
+        if input_type == "text_content":
+            return ("text", content_digest(str(pdf_input)))
+        if input_type == "file":
+            try:
+                stat = os.stat(str(pdf_input))
+            except OSError:
+                return None
+            return ("file", os.path.abspath(str(pdf_input)), stat.st_mtime_ns, stat.st_size)
+        return None
+
     def process_pdf(self, pdf_input: Union[str, bytes], input_type: str = "file") -> PDFAnalysis:
         """
         Main method to process a PDF document or PDF-like text.
@@ -203,11 +319,19 @@ class PDFAgent:
             pdf_input: File path (str), PDF bytes, or raw text content (str).
             input_type: "file", "bytes", or "text_content".
         """
+        if input_type == "bytes":
+            pdf_input = bytes(pdf_input)
+        key = self._cache_key(pdf_input, input_type)
+        if key is None:
+            return self._process_pdf(pdf_input, input_type)
+        return self._analysis_cache.get_or_compute(key, self._process_pdf, pdf_input, input_type)
+
+    def _process_pdf(self, pdf_input: Union[str, bytes], input_type: str) -> PDFAnalysis:
         text = ""
         if input_type == "file":
             text = self._extract_text_from_file(str(pdf_input))
         elif input_type == "bytes":
-            text = self._extract_text_from_bytes(bytes(pdf_input))
+            text = self._extract_text_from_bytes(pdf_input)
         elif input_type == "text_content":
             text = str(pdf_input)
         else:
@@ -225,9 +349,11 @@ class PDFAgent:
                 raw_text_preview="N/A"
             )
 
-        doc_type, confidence = self._detect_document_type(text)
-        extracted_data = self._extract_structured_data(text, doc_type)
-        compliance_keywords = self._detect_compliance_issues(text)
+        # Lowercase once; document type, invoice field and compliance detection all search this copy
+        text_lower = text.lower()
+        doc_type, confidence = self._detect_document_type(text, text_lower)
+        extracted_data = self._extract_structured_data(text, doc_type, text_lower)
+        compliance_keywords = self._detect_compliance_issues(text, text_lower)
         flags = self._flag_risks(extracted_data, compliance_keywords, doc_type)
         risk_score = self._calculate_risk_score(flags, doc_type)
         action = self._determine_action(flags, risk_score, doc_type)
@@ -245,12 +371,29 @@ class PDFAgent:
 
     def get_extracted_fields(self, analysis_result: PDFAnalysis) -> Dict[str, Any]:
         """Converts PDFAnalysis to a dictionary for storage/response."""
-        # Convert enums to their string values for JSON serialization
-        result_dict = asdict(analysis_result)
-        result_dict["document_type"] = analysis_result.document_type.value
-        result_dict["flags"] = [flag.value for flag in analysis_result.flags]
-        result_dict["suggested_action"] = analysis_result.suggested_action.value
-        return result_dict
+        # Built field by field rather than through asdict(), which deep-copies the extracted fields.
+        # Enums become their string values for JSON serialization.
+        return {
+            "document_type": analysis_result.document_type.value,
+            "confidence": analysis_result.confidence,
+            "extracted_fields": dict(analysis_result.extracted_fields),
+            "compliance_keywords_found": list(analysis_result.compliance_keywords_found),
+            "flags": [flag.value for flag in analysis_result.flags],
+            "risk_score": analysis_result.risk_score,
+            "suggested_action": analysis_result.suggested_action.value,
+            "raw_text_preview": analysis_result.raw_text_preview
+        }
+
+def process_pdfs(pdf_inputs: List[Union[str, bytes]], input_type: str = "file", workers: Optional[int] = None,
+                 chunksize: int = 4, use_pymupdf: bool = False) -> List[PDFAnalysis]:
+    """
+    Process a batch of PDFs of one input_type across worker processes (default: one per CPU).
+    Each worker builds its PDFAgent once (see PDFAgent for use_pymupdf); documents are heavy, so they
+    are handed out a few at a time.
+    """
+    agent_factory = functools.partial(PDFAgent, use_pymupdf=use_pymupdf)
+    process_pdf = functools.partial(PDFAgent.process_pdf, input_type=input_type)
+    return map_in_processes(agent_factory, process_pdf, pdf_inputs, workers=workers, chunksize=chunksize)
 
 # Example usage and testing
 if __name__ == "__main__":
@@ -13,7 +13,7 @@ from multi_agent_system.memory.memory_store import MemoryStore, InputMetadata
 from multi_agent_system.agents.classifier_agent import ClassifierAgent, ClassificationResult, FormatType, IntentType
 from multi_agent_system.agents.email_agent import EmailAgent, EmailAnalysis
 from multi_agent_system.agents.json_agent import JSONAgent, JSONAnalysis
-from multi_agent_system.agents.pdf_agent import PDFAgent, PDFAnalysis # Assuming PDFAnalysis is defined here
+from multi_agent_system.agents.pdf_agent import PDFAgent, PDFAnalysis, use_pymupdf_from_env # Assuming PDFAnalysis is defined here
 from multi_agent_system.routers.action_router import ActionRouter, ActionRequest, ActionResult, ActionType, ActionPriority
 
 app = FastAPI(title="Multi-Format Autonomous AI System")
@@ -23,7 +23,7 @@ memory_store = MemoryStore() # Uses default "memory_store.db"
 classifier_agent = ClassifierAgent()
 email_agent = EmailAgent()
 json_agent = JSONAgent()
-pdf_agent = PDFAgent()
+pdf_agent = PDFAgent(use_pymupdf=use_pymupdf_from_env()) # PyPDF2 unless PDF_AGENT_USE_PYMUPDF=1
 action_router = ActionRouter(memory_store=memory_store)
 
 # --- Pydantic Models for API ---
@@ -176,7 +176,7 @@ async def process_uploaded_file(
     file: UploadFile = File(...)
 ):
     """
-    Processes an uploaded file. Supports PDF (parsed with PyPDF2), EML (processed as text),
+    Processes an uploaded file. Supports PDF (parsed with PyPDF2, or PyMuPDF when PDF_AGENT_USE_PYMUPDF=1), EML (processed as text),
     JSON files, and TXT files (treated as potential PDF-like text or general text).
     """
     session_id = str(uuid.uuid4())
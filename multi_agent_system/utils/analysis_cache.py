@@ -0,0 +1,42 @@
+import copy
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar, Union
+
+# Number of recent results each agent keeps
+ANALYSIS_CACHE_SIZE = 1024
+
+T = TypeVar('T')
+
+def content_digest(content: Union[str, bytes]) -> bytes:
+    """16-byte blake2b digest of `content`, so cache keys don't keep whole documents alive"""
+    if isinstance(content, str):
+        content = content.encode('utf-8', 'surrogatepass')
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+class AnalysisCache:
+    """
+    Least-recently-used cache of an agent's results. Retries, replayed webhooks, auto-replies and
+    templated documents resend identical content, and a lookup is far cheaper than analysing it again.
+
+    Every result handed out is a deep copy, so a caller changing its result, or anything nested in
+    it, can't change what the cache returns to later callers.
+    """
+
+    def __init__(self, maxsize: int = ANALYSIS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._results: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[..., T], *args: Any) -> T:
+        """A copy of the result cached under `key`, computed as compute(*args) and cached when it isn't there"""
+        result = self._results.get(key)
+        if result is None:
+            result = self._results[key] = compute(*args)
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        else:
+            self._results.move_to_end(key)
+        return copy.deepcopy(result)
@@ -0,0 +1,268 @@
+import re
+from collections import Counter
+from typing import Iterator, List, Optional, Tuple
+
+_REGEX_META = set('\\.^$*+?{}[]|()')
+_QUANTIFIERS = set('*?{')
+_PATTERN_TOKEN_RE = re.compile(r'\\.|.', re.DOTALL)
+
+def _structure_tokens(pattern: str) -> Iterator[Tuple[List[str], int, int]]:
+    """(tokens, index, depth) for each token of `pattern` outside character classes, depth counting the groups around it"""
+    tokens = _PATTERN_TOKEN_RE.findall(pattern)
+    depth, in_class = 0, False
+    for index, token in enumerate(tokens):
+        if in_class:
+            # A ] straight after [ or [^ is a literal
+            in_class = token != ']' or tokens[index - 1] == '[' or tokens[index - 2:index] == ['[', '^']
+            continue
+        if token == '[':
+            in_class = True
+        elif token == ')':
+            depth -= 1
+        yield tokens, index, depth
+        if token == '(':
+            depth += 1
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    """Whether `pattern` has a | outside every group, e.g. r'refund|chargeback'"""
+    return any(tokens[index] == '|' and depth == 0 for tokens, index, depth in _structure_tokens(pattern))
+
+def _group_alternatives(body: str) -> Optional[Tuple[List[str], str]]:
+    """
+    The alternatives of the group `body` starts with, split at its own | (not an escaped one or one inside [...]),
+    and the pattern text after the group; None when the group is unclosed or holds another group
+    """
+    splits = []
+    for tokens, index, depth in _structure_tokens(body):
+        token = tokens[index]
+        if index == 0:
+            continue
+        if token == '(':
+            return None
+        if token == '|' and depth == 1:
+            splits.append(index)
+        elif token == ')' and depth == 0:
+            bounds = [0] + splits + [index]
+            return [''.join(tokens[start + 1:end]) for start, end in zip(bounds, bounds[1:])], ''.join(tokens[index + 1:])
+    return None
+
+def _leading_literal(alternative: str) -> str:
+    """Longest plain-text prefix that every match of `alternative` has to start with"""
+    end = 0
+    while end < len(alternative) and alternative[end] not in _REGEX_META:
+        end += 1
+    if end < len(alternative) and alternative[end] in _QUANTIFIERS:
+        end -= 1 # The last character is optional, e.g. r'invoices?'
+    return alternative[:max(end, 0)]
+
+def _strip_anchors(pattern: str) -> str:
+    """Drop the zero-width ^ and \\b assertions a pattern starts with"""
+    while pattern.startswith(('^', r'\b')):
+        pattern = pattern[1:] if pattern.startswith('^') else pattern[2:]
+    return pattern
+
+def leading_literals(pattern: str) -> Optional[Tuple[str, ...]]:
+    """
+    Literals one of which must occur in any text `pattern` matches, or None when
+    the pattern does not start with plain text (after an optional ^ or \\b) or has
+    a top-level |, whose other branches could match without them.
+    Handles the keyword form r'\\b(alt|alt|...)\\b' used throughout the agents.
+    """
+    if _has_top_level_alternation(pattern):
+        return None
+    body = _strip_anchors(pattern)
+
+    if body.startswith('('):
+        group = _group_alternatives(body)
+        if group is None or group[1][:1] in _QUANTIFIERS:
+            return None
+        alternatives = group[0]
+    else:
+        alternatives = [body]
+
+    literals = [_leading_literal(alt) for alt in alternatives]
+    if not all(literals):
+        return None
+    # Any text containing 'total due' also contains 'total', so only the shortest distinct literals need checking
+    unique = list(dict.fromkeys(literals))
+    return tuple(lit for lit in unique if not any(other != lit and other in lit for other in unique))
+
+_CHARACTER_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v'}
+_TRAILING_LOOKAHEAD_RE = re.compile(r'\(\?=([^()]*)\)$')
+
+def _literal_character(token: str) -> Optional[str]:
+    """The character a pattern token stands for, or None when it is regex syntax such as \\s or *"""
+    if len(token) == 1:
+        return None if token in _REGEX_META else token
+    if token[1] in _CHARACTER_ESCAPES:
+        return _CHARACTER_ESCAPES[token[1]]
+    return None if token[1].isalnum() else token[1]
+
+def _alternative_literals(alternative: str) -> Tuple[str, str]:
+    """The plain text every match of `alternative` starts and ends with (all of it for plain text)"""
+    tokens = _PATTERN_TOKEN_RE.findall(alternative)
+    characters = [_literal_character(token) for token in tokens]
+    if None not in characters:
+        return ''.join(characters), ''.join(characters)
+
+    leading = characters.index(None)
+    if tokens[leading][0] in _QUANTIFIERS or tokens[leading] == '+':
+        leading -= 1 # The last character is optional or repeated, e.g. r'items?'
+    trailing = len(characters)
+    while characters[trailing - 1] is not None:
+        trailing -= 1
+    return ''.join(characters[:max(leading, 0)]), ''.join(characters[trailing:])
+
+def _sees_only_consumed_text(pattern: str) -> bool:
+    """
+    Whether `pattern` has no top-level |, end-of-text assertion or lookaround (outside character
+    classes), so a lookahead appended to it is required and nothing else looks past a match's end
+    """
+    for tokens, index, depth in _structure_tokens(pattern):
+        token = tokens[index]
+        if token in ('$', '\\Z') or (token == '|' and depth == 0):
+            return False
+        if token == '(' and tokens[index + 1:index + 3] in (['?', '='], ['?', '!'], ['?', '<']):
+            return False
+    return True
+
+def lookahead_terminators(pattern: str) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """
+    For a pattern of the form r'...(?=alt|alt|...)', the (leading, trailing) literals of each
+    alternative of its lookahead. None when the pattern isn't in that form, an alternative doesn't
+    start and end in plain text, or the rest of the pattern could look past the lookahead.
+    """
+    lookahead = _TRAILING_LOOKAHEAD_RE.search(pattern)
+    if lookahead is None or not _sees_only_consumed_text(pattern[:lookahead.start()]):
+        return None
+    literals = [_alternative_literals(alt) for alt in lookahead.group(1).split('|')]
+    return tuple(dict.fromkeys(literals)) if all(leading and trailing for leading, trailing in literals) else None
+
+# The only characters whose lowercase form either isn't one character or doesn't match ASCII letters the way
+# re.IGNORECASE does ('İ', dotless 'ı', long 'ſ'), mapped to the letter IGNORECASE matches each of them with.
+# Translated this way and lowercased, text matches lowercase patterns exactly as IGNORECASE would.
+CASE_FOLD_EXCEPTIONS = {'\u0130': 'i', '\u0131': 'i', '\u017f': 's'}
+CASE_FOLD_TRANSLATION = str.maketrans(CASE_FOLD_EXCEPTIONS)
+
+def has_case_fold_exceptions(text: str) -> bool:
+    """Whether `text` holds one of CASE_FOLD_EXCEPTIONS, which lowercasing alone doesn't fold the way IGNORECASE does"""
+    return not text.isascii() and any(char in text for char in CASE_FOLD_EXCEPTIONS)
+
+class KeywordPattern:
+    """
+    A compiled regex paired with the literal text its matches start with.
+
+    search() first checks those literals with plain substring scans and only runs
+    the regex engine when one of them occurs, so patterns whose keywords are absent
+    cost a handful of C-level scans instead of a full regex pass.
+    With re.IGNORECASE the text passed to search() must already be lowercased.
+
+    A leading ^ or \\b keeps re from jumping ahead to the literal prefix and makes it
+    try every offset, so the regex pass scans with those assertions stripped and only
+    checks them at the candidate positions it finds.
+
+    A pattern ending in a lookahead such as r'([\\s\\S]*?)(?=\\n\\n|\\nitem)' costs a scan to the end
+    of the text for every keyword occurrence with no terminator after it, which is quadratic
+    in long documents. The text a match's lookahead sees ends with the trailing literal of one
+    of its alternatives, so the regex pass stops after the last occurrence of those literals
+    (skipping alternatives whose leading literal never occurs), and is skipped when none occur.
+    """
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = re.compile(pattern, flags)
+        literals = leading_literals(pattern)
+        if literals is not None and flags & re.IGNORECASE:
+            literals = tuple(literal.lower() for literal in literals)
+        self.literals = literals
+
+        unanchored = _strip_anchors(pattern)
+        self._scan = re.compile(unanchored, flags) if literals is not None and unanchored != pattern else None
+        # Patterns without any regex syntax, e.g. r'"amount":', are answered by a substring check alone
+        self._exact_literal = literals[0] if literals is not None and not _REGEX_META.intersection(pattern) else None
+
+        terminators = lookahead_terminators(pattern)
+        if terminators is not None and flags & re.IGNORECASE:
+            terminators = tuple((leading.lower(), trailing.lower()) for leading, trailing in terminators)
+        self.terminators = terminators
+
+    def matches(self, text: str) -> bool:
+        """Whether search() would find a match, without building a match object for plain literals"""
+        if self._exact_literal is not None:
+            return self._exact_literal in text
+        return self.search(text) is not None
+
+    def _end_bound(self, text: str) -> int:
+        """Position no match can extend past, or -1 when the pattern can't match `text` at all"""
+        if self.terminators is None:
+            return len(text)
+        bound = -1
+        for leading, trailing in self.terminators:
+            # Every match of the alternative starts with `leading` and ends with `trailing`
+            if leading != trailing and leading not in text:
+                continue
+            position = text.rfind(trailing)
+            if position != -1:
+                bound = max(bound, position + len(trailing))
+        return bound
+
+    def search(self, text: str) -> Optional[re.Match]:
+        if self.literals is not None and not any(literal in text for literal in self.literals):
+            return None
+        endpos = self._end_bound(text)
+        if endpos == -1:
+            return None
+        if self._scan is None:
+            return self.pattern.search(text, 0, endpos)
+
+        candidate = self._scan.search(text, 0, endpos)
+        while candidate is not None:
+            # The assertions are zero-width, so the leftmost candidate that passes them is the leftmost match
+            start = candidate.start()
+            match = self.pattern.match(text, start, endpos)
+            if match is not None:
+                return match
+            candidate = self._scan.search(text, start + 1, endpos)
+        return None
+
+WORD_RE = re.compile(r'\w+')
+_PLAIN_WORD_RE = re.compile(r'[A-Za-z0-9_]+')
+
+def count_words(text: str) -> Counter:
+    """Occurrences of every maximal run of word characters, in order of first appearance"""
+    return Counter(WORD_RE.findall(text))
+
+class WordAlternation:
+    """
+    A keyword pattern such as r'\\b(urgent|asap|needs\\s+attention)\\b', split into its plain
+    words and the remaining multi-word phrases.
+
+    r'\\bword\\b' matches exactly where a whole run of word characters equals `word`, so the
+    plain words are answered from count_words() of the same text; only the phrases still
+    need a regex pass, behind KeywordPattern's literal prefilter. Patterns not in that form
+    keep using the full regex.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = re.compile(pattern)
+        group = _group_alternatives(pattern[2:]) if pattern.startswith(r'\b(') else None
+        if group is None or group[1] != r'\b':
+            self.words, self.phrases = (), KeywordPattern(pattern)
+            return
+
+        alternatives = group[0]
+        self.words = tuple(alt for alt in alternatives if _PLAIN_WORD_RE.fullmatch(alt))
+        phrases = [alt for alt in alternatives if alt not in self.words]
+        self.phrases = KeywordPattern(r'\b(' + '|'.join(phrases) + r')\b') if phrases else None
+
+    def found_in(self, text: str, word_counts: Counter) -> bool:
+        """Whether the pattern matches `text`, given count_words(text)"""
+        if any(word in word_counts for word in self.words):
+            return True
+        return self.phrases is not None and self.phrases.matches(text)
+
+    def count_in(self, text: str, word_counts: Counter) -> int:
+        """Number of non-overlapping matches in `text`, as len(pattern.findall(text)), given count_words(text)"""
+        if self.phrases is None:
+            # Whole-word matches can't overlap each other
+            return sum(word_counts[word] for word in self.words)
+        return len(self.pattern.findall(text))
@@ -0,0 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+class FrozenSlotsPickling:
+    """
+    Mixin for frozen, slotted dataclasses whose instances are sent to or from worker processes.
+    pickle restores slotted instances through setattr, which frozen dataclasses forbid.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+# Agent and function of this worker process, set up once by _init_worker
+_worker_agent: Any = None
+_worker_function: Optional[Callable[[Any, Any], Any]] = None
+
+def _init_worker(agent_factory: Callable[[], Any], function: Callable[[Any, Any], Any]) -> None:
+    global _worker_agent, _worker_function
+    _worker_agent = agent_factory()
+    _worker_function = function
+
+def _run_in_worker(item: Any) -> Any:
+    return _worker_function(_worker_agent, item)
+
+def map_in_processes(agent_factory: Callable[[], Any], function: Callable[[Any, Any], Any], items: Iterable[Any],
+                     workers: Optional[int] = None, chunksize: int = 1) -> List[Any]:
+    """
+    function(agent, item) for every item, in order, across worker processes (default: one per CPU).
+    Each worker builds its agent once with agent_factory(), and items are handed out `chunksize` at a time.
+    Both callables are pickled to the workers, so they must be classes, module-level functions, methods
+    or functools.partial objects of those. With workers=1 everything runs in this process instead.
+    """
+    if workers == 1:
+        agent = agent_factory()
+        return [function(agent, item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(agent_factory, function)) as executor:
+        return list(executor.map(_run_in_worker, items, chunksize=chunksize))
@@ -0,0 +1,80 @@
+"""
+ClassifierAgent routing decisions and its result cache.
+Run from the repository root: python -m unittest discover -s tests
+"""
+import unittest
+from unittest import mock
+
+from multi_agent_system.agents.classifier_agent import ClassifierAgent, FormatType
+from multi_agent_system.utils.keyword_patterns import KeywordPattern
+
+EMAIL_HEADERS = "From: alice@example.com\nTo: bob@example.com\nSubject: Invoice question\n\nHello Bob,"
+# Text matching every one of the classifier's PDF format patterns
+PDF_TEXT = ("Invoice #123\nBill to: Acme\nTotal due: $50.00\nSubtotal: $40.00\nDue date: 01/01/2025\n"
+            "Privacy policy\nGDPR\nEffective date: 01/01/2025\n")
+
+class ExtensionRoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = ClassifierAgent()
+
+    def test_trusted_extension_beats_content(self):
+        for filename, format_type in (("mail.pdf", FormatType.PDF), ("invoice.eml", FormatType.EMAIL),
+                                      ("invoice.MSG", FormatType.EMAIL)):
+            with self.subTest(filename=filename):
+                result = self.classifier.classify(PDF_TEXT if format_type == FormatType.EMAIL else EMAIL_HEADERS, filename)
+                self.assertEqual(result.format_type, format_type)
+                self.assertTrue(result.reasoning.startswith(f"Format taken from filename '{filename}'"))
+
+    def test_json_extension_needs_valid_json(self):
+        result = self.classifier.classify('{"amount": 5}', "payload.json")
+        self.assertEqual(result.format_type, FormatType.JSON)
+        self.assertTrue(result.reasoning.startswith("Format taken from filename"))
+
+        # Invalid JSON is classified from content, with the extension as the fallback
+        result = self.classifier.classify("not json", "payload.json")
+        self.assertEqual(result.format_type, FormatType.JSON)
+        self.assertTrue(result.reasoning.startswith("Format inferred from filename"))
+        self.assertEqual(self.classifier.classify(EMAIL_HEADERS, "payload.json").format_type, FormatType.EMAIL)
+
+    def test_txt_extension_is_only_a_hint(self):
+        self.assertEqual(self.classifier.classify(EMAIL_HEADERS, "notes.txt").format_type, FormatType.EMAIL)
+        self.assertEqual(self.classifier.classify(PDF_TEXT, "notes.txt").format_type, FormatType.PDF)
+
+    def test_empty_content_falls_back_to_extension(self):
+        result = self.classifier.classify("", "scan.pdf")
+        self.assertEqual(result.format_type, FormatType.PDF)
+        self.assertTrue(result.reasoning.startswith("Format inferred from filename"))
+
+class EmailHeaderTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = ClassifierAgent()
+
+    def test_headers_count_only_in_the_first_2048_characters(self):
+        self.assertEqual(self.classifier.classify_format(" " * 1900 + "\n" + EMAIL_HEADERS), (FormatType.EMAIL, 1.0))
+        # Headers starting at character 2048 only count through the weaker body patterns
+        format_type, confidence = self.classifier.classify_format(" " * 2047 + "\n" + EMAIL_HEADERS)
+        self.assertEqual(format_type, FormatType.EMAIL)
+        self.assertLess(confidence, 1.0)
+
+    def test_all_headers_return_before_the_pdf_patterns(self):
+        with mock.patch.object(KeywordPattern, "matches", side_effect=AssertionError("format patterns scanned")):
+            self.assertEqual(self.classifier.classify_format(EMAIL_HEADERS + "\n" + PDF_TEXT), (FormatType.EMAIL, 1.0))
+
+    def test_partial_headers_still_weigh_pdf_patterns(self):
+        format_type, _ = self.classifier.classify_format("From: alice@example.com\n" + PDF_TEXT)
+        self.assertEqual(format_type, FormatType.PDF)
+
+class ClassifyCacheTest(unittest.TestCase):
+    def test_repeat_documents_are_classified_once(self):
+        classifier = ClassifierAgent()
+        with mock.patch.object(classifier, "_classify", wraps=classifier._classify) as classify:
+            first = classifier.classify(PDF_TEXT, "invoice.txt")
+            second = classifier.classify(PDF_TEXT, "invoice.txt")
+            batch = classifier.classify_batch([(PDF_TEXT, "invoice.txt"), (PDF_TEXT, None)])
+        self.assertEqual(classify.call_count, 2) # Keyed on the filename as well as the content
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(batch[0], first)
+
+if __name__ == "__main__":
+    unittest.main()
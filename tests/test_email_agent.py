@@ -0,0 +1,25 @@
+"""
+EmailAgent's analysis cache.
+Run from the repository root: python -m unittest discover -s tests
+"""
+import unittest
+from unittest import mock
+
+from multi_agent_system.agents.email_agent import EmailAgent
+
+EMAIL = "From: alice@example.com\nTo: support@company.com\nSubject: Urgent\n\nThis is terrible, it needs attention asap."
+
+class AnalysisCacheTest(unittest.TestCase):
+    def test_hits_are_copies(self):
+        agent = EmailAgent()
+        with mock.patch.object(agent, "_process_email", wraps=agent._process_email) as process_email:
+            first = agent.process_email(EMAIL)
+            first.keywords.append("changed")
+            second = agent.process_email(EMAIL)
+        self.assertEqual(process_email.call_count, 1)
+        self.assertIsNot(first, second)
+        self.assertNotIn("changed", second.keywords)
+        self.assertEqual(second, EmailAgent().process_email(EMAIL))
+
+if __name__ == "__main__":
+    unittest.main()
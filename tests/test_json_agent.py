@@ -0,0 +1,88 @@
+"""
+JSONAgent parsing through _loads and its analysis cache.
+Run from the repository root: python -m unittest discover -s tests
+"""
+import json
+import unittest
+from unittest import mock
+
+from multi_agent_system.agents import json_agent
+from multi_agent_system.agents.json_agent import JSONAgent, _loads
+
+# Inputs json.loads accepts, including those orjson rejects or parses differently
+DOCUMENTS = [
+    '{"transaction_id": "t1", "amount": 1.5, "nested": {"k": [1, 2]}}',
+    '{"id": 123456789012345678}', # 18 digits, always within 64 bits
+    '{"id": 9999999999999999999}', # 19 digits, beyond a signed 64-bit integer
+    '{"id": 12345678901234567890123}', # orjson would turn this into a float
+    '[-99999999999999999999]',
+    '{"id": "12345678901234567890"}', # Digits inside a string
+    '{"id": 12345678901234567890.5}',
+    'NaN',
+    '[Infinity, -Infinity]',
+    '"\\ud800"', # Lone surrogate
+    '{"k": "é"}',
+    ' [1, 2] ',
+]
+
+class LoadsTest(unittest.TestCase):
+    def test_matches_json_loads(self):
+        for document in DOCUMENTS:
+            with self.subTest(document=document):
+                # repr() so NaN compares equal to itself
+                self.assertEqual(repr(_loads(document)), repr(json.loads(document)))
+
+    def test_long_integers_keep_exact_values(self):
+        value = _loads('{"id": 12345678901234567890123}')["id"]
+        self.assertIsInstance(value, int)
+        self.assertEqual(value, 12345678901234567890123)
+
+    def test_invalid_json_raises_json_errors(self):
+        for document in ('{', '', '{"a":}', '[1,]'):
+            with self.subTest(document=document):
+                with self.assertRaises(json.JSONDecodeError) as raised:
+                    _loads(document)
+                with self.assertRaises(json.JSONDecodeError) as expected:
+                    json.loads(document)
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+    @unittest.skipUnless(json_agent.orjson is not None, "orjson isn't installed")
+    def test_orjson_skipped_for_long_digit_runs(self):
+        with mock.patch.object(json_agent.orjson, "loads", wraps=json_agent.orjson.loads) as orjson_loads:
+            _loads('{"id": 123456789012345678}')
+            self.assertEqual(orjson_loads.call_count, 1)
+            _loads('{"id": 1234567890123456789}')
+            self.assertEqual(orjson_loads.call_count, 1)
+
+class AnalysisCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = JSONAgent()
+        self.process_json = mock.patch.object(self.agent, "_process_json", wraps=self.agent._process_json).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_hits_are_deep_copies(self):
+        payload = '{"payload": {"k": [1, 2]}}'
+        first = self.agent.process_json(payload)
+        first.extracted_data_preview["payload"]["k"].append(99)
+        first.anomalies_detected.clear()
+        second = self.agent.process_json(payload)
+        self.assertEqual(second.extracted_data_preview, {"payload": {"k": [1, 2]}})
+        self.assertTrue(second.anomalies_detected)
+        self.assertEqual(self.process_json.call_count, 1)
+
+    def test_keyed_on_schema(self):
+        payload = '{"transaction_id": "t1"}'
+        self.agent.process_json(payload)
+        self.agent.process_json(payload, None)
+        self.agent.process_json(payload, None)
+        self.assertEqual(self.process_json.call_count, 2)
+
+    def test_large_payloads_are_not_cached(self):
+        payload = json.dumps({"payload": "x" * 5000})
+        self.agent.process_json(payload)
+        self.agent.process_json(payload)
+        self.assertEqual(self.process_json.call_count, 2)
+        self.assertEqual(len(self.agent._analysis_cache), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+KeywordPattern and WordAlternation must give exactly what plain re gives for the same pattern.
+Run from the repository root: python -m unittest discover -s tests
+"""
+import os
+import random
+import re
+import unittest
+
+from multi_agent_system.agents.classifier_agent import ClassifierAgent
+from multi_agent_system.agents.email_agent import EmailAgent
+from multi_agent_system.agents.pdf_agent import PDFAgent
+from multi_agent_system.utils.keyword_patterns import KeywordPattern, WordAlternation, count_words, leading_literals
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+# Pieces the random documents are assembled from: keywords and near-misses of the agents' patterns,
+# terminators of the bill-to lookaheads, and characters that word boundaries and case folding treat specially
+FRAGMENTS = [
+    "invoice", "Invoice #", "inv-", "INV - ", "invoice number: ", "date: ", "due date: ", "01/02/2024", "March 5, 2024",
+    "total due", "grand total", "amount due: $", "subtotal: ", "tax (8%): ", "1,234.56", "12.00", "$",
+    "bill to:", "Bill To\n", "customer: ", "ship to", "item", "description", "payment terms", "notes", "thank you",
+    "quantity", "qty", "unit price", "price", "amount", "total",
+    "from:", "From: a@b.com", "to:", "subject:", "Subject: hi", "dear", "regards", "sincerely",
+    "urgent", "asap", "now", "needs attention", "needs  attention", "thank you", "follow-up", "critical issue",
+    "complaint", "refund", "gdpr", "general data protection regulation", "fda", "policy", "terms of service",
+    '{"amount": 5}', '"transaction_id"', "rfq", "quote", "regulation", "compliance",
+    " ", "  ", "\n", "\n\n", "\t", ":", "-", "_", "#", ".", "é", "İ", "ı", "ſ", "ß", "ǅ",
+]
+
+def random_documents(seed: int, count: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40)))
+
+def sample_documents():
+    for directory, _, filenames in os.walk(SAMPLES_DIR):
+        for filename in sorted(filenames):
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                yield f.read()
+
+def documents(seed: int, count: int = 400):
+    """Sample files and random documents, each as written and lowercased as the agents search them"""
+    for text in list(sample_documents()) + list(random_documents(seed, count)):
+        yield text
+        yield text.lower()
+
+def agent_keyword_patterns():
+    classifier = ClassifierAgent()
+    pdf_agent = PDFAgent()
+    for patterns in list(classifier.format_patterns.values()) + list(classifier.intent_keywords.values()):
+        yield from patterns
+    for patterns in pdf_agent.COMPLIANCE_KEYWORDS.values():
+        yield from patterns
+    for patterns in pdf_agent._invoice_patterns_lower.values():
+        yield from patterns
+
+def agent_word_alternations():
+    email_agent = EmailAgent()
+    for table in (email_agent.TONE_KEYWORDS, email_agent.URGENCY_KEYWORDS, email_agent.SENTIMENT_KEYWORDS):
+        for patterns in table.values():
+            yield from patterns
+
+def span_and_groups(match):
+    return None if match is None else (match.span(), match.groups())
+
+class KeywordPatternTest(unittest.TestCase):
+    def assert_same_as_re(self, keyword_pattern: KeywordPattern, texts):
+        for text in texts:
+            expected = keyword_pattern.pattern.search(text)
+            with self.subTest(pattern=keyword_pattern.pattern.pattern, text=text):
+                self.assertEqual(span_and_groups(keyword_pattern.search(text)), span_and_groups(expected))
+                self.assertEqual(keyword_pattern.matches(text), expected is not None)
+
+    def test_agent_patterns_match_like_re(self):
+        texts = list(documents(seed=0))
+        for keyword_pattern in agent_keyword_patterns():
+            self.assert_same_as_re(keyword_pattern, texts)
+
+    def test_top_level_alternation_is_not_prefiltered(self):
+        self.assertIsNone(leading_literals("cat|dog"))
+        self.assertIsNone(leading_literals(r"\binvoice\b|bill"))
+        self.assertEqual(leading_literals(r"\b(cat|dog)\b"), ("cat", "dog"))
+        self.assertTrue(KeywordPattern("cat|dog").matches("a dog"))
+
+        patterns = ["cat|dog", r"^from:|^to:", r"\binvoice\b|bill\s+to", r"(cat|dog)|bird", r"[|]x|y", r"\(a|b\)"]
+        texts = ["a dog", "bird", "from: a", "x\nto: b", "the invoice", "bill  to", "|x", "y", "(a", "b)", "catdog", ""]
+        for pattern in patterns:
+            self.assert_same_as_re(KeywordPattern(pattern, re.MULTILINE), texts)
+
+    def test_groups_with_escaped_or_bracketed_parens(self):
+        self.assertEqual(leading_literals(r"(a\)|b)"), ("a", "b"))
+        self.assertEqual(leading_literals(r"(x[)]|y)"), ("x", "y"))
+        self.assertIsNotNone(KeywordPattern(r"(a\)|b)").search("b"))
+        self.assertIsNotNone(KeywordPattern(r"(x[)]|y)").search("y"))
+
+        patterns = [r"(a\)|b)", r"(x[)]|y)", r"\b(a\|b|c)\b", r"([|]x|y)", r"(a\(|b)c", r"(a[()|]|b)+"]
+        texts = ["b", "y", "a)", "x)", "a|b", "c", "|x", "a(c", "bc", "a|a(b", "xyz", ""]
+        for pattern in patterns:
+            self.assert_same_as_re(KeywordPattern(pattern), texts)
+
+    def test_anchored_patterns(self):
+        patterns = [r"^from:\s*\S+@\S+", r"^subject:", r"\bnow\b", r"\b(invoice|bill)\b", r"^\binvoice", r"\binv\s*-\s*(\d+)"]
+        texts = ["from: a@b.com", "x from: a@b.com", "x\nfrom: a@b.com", "subject: x", " subject:", "snow now",
+                 "nownow", "invoices invoice", "\ninvoice", "invoice", "_invoice", "éinvoice", "xinv-12 inv - 34"]
+        for pattern in patterns:
+            for flags in (0, re.MULTILINE):
+                self.assert_same_as_re(KeywordPattern(pattern, flags), texts)
+
+    def test_lookahead_terminated_patterns(self):
+        patterns = [
+            r"bill\s+to\s*[:\s]*\n?([\s\S]*?)(?=\n\n|\nship\s+to|\nitem|\ndescription|payment\s+terms|notes|thank\s+you|subtotal)",
+            r"customer\s*[:\s]*\n?([\s\S]*?)(?=\n\n|\nitem)",
+            r"key([\s\S]*?)(?=end|stop)",
+            r"key(.*?)(?=\n\n|\s+end)", # The lookahead's last alternative has no plain text to bound the search with
+            r"key([\s\S]*?)$(?=\n)", # Looks at the end of the text, so it must not be bounded
+            r"key(?!x)([\s\S]*?)(?=end)",
+        ]
+        texts = list(documents(seed=1, count=200)) + [
+            "key abc end", "key abc stop end", "key\n\nkey end", "key   end", "key x\n", "keyx end key end",
+            "bill to: acme\nship to x", "bill to:\nacme\n\nitem", "customer: bob\nitem 1", "bill to: x notes", "bill to",
+        ]
+        for pattern in patterns:
+            for flags in (0, re.DOTALL, re.MULTILINE):
+                self.assert_same_as_re(KeywordPattern(pattern, flags), texts)
+
+    def test_ignorecase_on_lowercased_text(self):
+        for pattern in [r"Invoice\s*#\s*(\d+)", r"\bGDPR\b", r"Total(?=\s+due)"]:
+            keyword_pattern = KeywordPattern(pattern, re.IGNORECASE)
+            self.assert_same_as_re(keyword_pattern, [text.lower() for text in documents(seed=2, count=200)])
+
+class WordAlternationTest(unittest.TestCase):
+    def assert_same_as_re(self, alternation: WordAlternation, texts):
+        for text in texts:
+            word_counts = count_words(text)
+            with self.subTest(pattern=alternation.pattern.pattern, text=text):
+                self.assertEqual(alternation.found_in(text, word_counts), alternation.pattern.search(text) is not None)
+                self.assertEqual(alternation.count_in(text, word_counts), len(alternation.pattern.findall(text)))
+
+    def test_agent_patterns_match_like_re(self):
+        texts = list(documents(seed=3))
+        for alternation in agent_word_alternations():
+            self.assert_same_as_re(alternation, texts)
+
+    def test_patterns_outside_keyword_form(self):
+        patterns = [r"urgent|asap", r"^urgent\b", r"\b(now|asap)", r"\b(follow-up|update)\b", r"\b(a(b|c))\b",
+                    r"\b(a\)|b)\b", r"\b(x[)]|y)\b", r"\b(a\|b|c)\b"]
+        texts = ["urgent", "asap now", "nowhere", "x urgent", "follow-up update", "ab ac", "follow-upx", "_now",
+                 "a) b", "x) y", "a|b", "a|bc c"]
+        for pattern in patterns:
+            self.assert_same_as_re(WordAlternation(pattern), texts + list(documents(seed=4, count=100)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+PDFAgent behaviour around text extraction and its analysis cache.
+Run from the repository root: python -m unittest discover -s tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from multi_agent_system.agents import pdf_agent
+from multi_agent_system.agents.pdf_agent import PDFAgent, process_pdfs, use_pymupdf_from_env
+
+INVOICE_TEXT = "Invoice Number: INV-2024-001\nDate: 01/15/2024\nTotal Due: $1,250.00"
+
+def minimal_pdf(text: str) -> bytes:
+    """A one-page PDF showing each line of `text` in Helvetica"""
+    lines = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in text.split("\n")]
+    content = "BT /F1 12 Tf 14 TL 72 720 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return pdf.encode("latin-1")
+
+class PyMuPDFOptInTest(unittest.TestCase):
+    def test_env_flag(self):
+        self.assertFalse(use_pymupdf_from_env({}))
+        self.assertFalse(use_pymupdf_from_env({"PDF_AGENT_USE_PYMUPDF": "0"}))
+        self.assertFalse(use_pymupdf_from_env({"PDF_AGENT_USE_PYMUPDF": ""}))
+        for value in ("1", "true", "True", " yes "):
+            self.assertTrue(use_pymupdf_from_env({"PDF_AGENT_USE_PYMUPDF": value}))
+
+    @unittest.skipUnless(pdf_agent.pymupdf is not None, "PyMuPDF isn't installed")
+    def test_default_agent_extracts_with_pypdf2(self):
+        pdf_bytes = minimal_pdf(INVOICE_TEXT)
+        with mock.patch.object(pdf_agent.pymupdf, "open", side_effect=AssertionError("PyMuPDF used")):
+            analysis = PDFAgent().process_pdf(pdf_bytes, input_type="bytes")
+            batch = process_pdfs([pdf_bytes], input_type="bytes", workers=1)
+        self.assertEqual(analysis.extracted_fields.get("invoice_number"), "INV-2024-001")
+        self.assertEqual(batch, [analysis])
+
+    @unittest.skipUnless(pdf_agent.pymupdf is not None, "PyMuPDF isn't installed")
+    def test_opted_in_agent_extracts_with_pymupdf(self):
+        pdf_bytes = minimal_pdf(INVOICE_TEXT)
+        with mock.patch.object(pdf_agent.pymupdf, "open", wraps=pdf_agent.pymupdf.open) as pymupdf_open:
+            analysis = PDFAgent(use_pymupdf=True).process_pdf(pdf_bytes, input_type="bytes")
+            process_pdfs([pdf_bytes], input_type="bytes", workers=1, use_pymupdf=True)
+        self.assertEqual(pymupdf_open.call_count, 2)
+        self.assertEqual(analysis.extracted_fields.get("invoice_number"), "INV-2024-001")
+
+    def test_opt_in_without_pymupdf_falls_back_to_pypdf2(self):
+        with mock.patch.object(pdf_agent, "pymupdf", None), mock.patch("builtins.print"):
+            agent = PDFAgent(use_pymupdf=True)
+            analysis = agent.process_pdf(minimal_pdf(INVOICE_TEXT), input_type="bytes")
+        self.assertEqual(analysis.extracted_fields.get("invoice_number"), "INV-2024-001")
+
+class AnalysisCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = PDFAgent()
+        self.process_pdf = mock.patch.object(self.agent, "_process_pdf", wraps=self.agent._process_pdf).start()
+        self.addCleanup(mock.patch.stopall)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "invoice.pdf")
+
+    def write_invoice(self, invoice_number: str, mtime_ns: int) -> None:
+        with open(self.path, "wb") as f:
+            f.write(minimal_pdf(INVOICE_TEXT.replace("INV-2024-001", invoice_number)))
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def invoice_number(self) -> str:
+        return self.agent.process_pdf(self.path, input_type="file").extracted_fields.get("invoice_number")
+
+    def test_hits_are_copies(self):
+        pdf_bytes = minimal_pdf(INVOICE_TEXT)
+        first = self.agent.process_pdf(pdf_bytes, input_type="bytes")
+        first.extracted_fields["invoice_number"] = "changed"
+        first.flags.append("changed")
+        second = self.agent.process_pdf(pdf_bytes, input_type="bytes")
+        self.assertEqual(second.extracted_fields["invoice_number"], "INV-2024-001")
+        self.assertNotIn("changed", second.flags)
+        self.assertEqual(self.process_pdf.call_count, 1)
+
+    def test_unchanged_file_is_not_processed_again(self):
+        self.write_invoice("INV-1", 1_700_000_000_000_000_000)
+        self.assertEqual(self.invoice_number(), "INV-1")
+        self.assertEqual(self.invoice_number(), "INV-1")
+        self.assertEqual(self.process_pdf.call_count, 1)
+
+    def test_rewritten_file_is_processed_again(self):
+        self.write_invoice("INV-1", 1_700_000_000_000_000_000)
+        self.assertEqual(self.invoice_number(), "INV-1")
+        # Different size, same modification time
+        self.write_invoice("INV-22", 1_700_000_000_000_000_000)
+        self.assertEqual(self.invoice_number(), "INV-22")
+        # Same size, different modification time
+        self.write_invoice("INV-33", 1_700_000_000_000_000_001)
+        self.assertEqual(self.invoice_number(), "INV-33")
+        self.assertEqual(self.process_pdf.call_count, 3)
+
+    def test_missing_file_is_not_cached(self):
+        with mock.patch("builtins.print"):
+            self.agent.process_pdf(self.path, input_type="file")
+            self.agent.process_pdf(self.path, input_type="file")
+        self.assertEqual(self.process_pdf.call_count, 2)
+        self.assertEqual(len(self.agent._analysis_cache), 0)
+
+if __name__ == "__main__":
+    unittest.main()
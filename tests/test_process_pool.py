@@ -0,0 +1,76 @@
+"""
+The agents' batch helpers must return what calling each agent directly returns, in order.
+Run from the repository root: python -m unittest discover -s tests
+"""
+import glob
+import os
+import pickle
+import unittest
+
+from multi_agent_system.agents.classifier_agent import ClassifierAgent, classify_many
+from multi_agent_system.agents.email_agent import EmailAgent, process_emails
+from multi_agent_system.agents.json_agent import JSONAgent, process_many
+from multi_agent_system.agents.pdf_agent import PDFAgent, process_pdfs
+from multi_agent_system.utils.process_pool import map_in_processes
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+def read_samples(pattern: str):
+    contents = []
+    for path in sorted(glob.glob(os.path.join(SAMPLES_DIR, pattern))):
+        with open(path, encoding="utf-8") as f:
+            contents.append(f.read())
+    return contents
+
+class CountingAgent:
+    """Agent whose instances count the items they were given"""
+    instances = 0
+
+    def __init__(self):
+        CountingAgent.instances += 1
+        self.seen = 0
+
+    def handle(self, item):
+        self.seen += 1
+        return item * 2, self.seen
+
+class ProcessPoolTest(unittest.TestCase):
+    def test_serial_run_builds_one_agent(self):
+        CountingAgent.instances = 0
+        results = map_in_processes(CountingAgent, CountingAgent.handle, range(4), workers=1)
+        self.assertEqual(results, [(0, 1), (2, 2), (4, 3), (6, 4)])
+        self.assertEqual(CountingAgent.instances, 1)
+
+    def test_workers_keep_order(self):
+        results = map_in_processes(CountingAgent, CountingAgent.handle, range(50), workers=2, chunksize=3)
+        self.assertEqual([doubled for doubled, _ in results], [item * 2 for item in range(50)])
+
+    def test_classify_many(self):
+        documents = [(content, None) for content in read_samples("*/*")] + [('{"amount": 5}', "payload.json"), ("", None)]
+        expected = [ClassifierAgent().classify(content, filename) for content, filename in documents]
+        self.assertEqual(classify_many(documents, workers=2, chunksize=2), expected)
+        self.assertEqual(classify_many(documents, workers=1), expected)
+
+    def test_process_emails(self):
+        emails = read_samples("emails/*.eml")
+        self.assertEqual(process_emails(emails, workers=2), [EmailAgent().process_email(email) for email in emails])
+
+    def test_process_many(self):
+        payloads = read_samples("jsons/*.json") + ["not json", '{"nested": {"k": [1, 2]}}']
+        for schema in ("transaction_schema", None):
+            expected = [JSONAgent().process_json(payload, schema) for payload in payloads]
+            self.assertEqual(process_many(payloads, schema, workers=2), expected)
+
+    def test_process_pdfs(self):
+        texts = read_samples("pdfs/*.txt")
+        expected = [PDFAgent().process_pdf(text, input_type="text_content") for text in texts]
+        self.assertEqual(process_pdfs(texts, input_type="text_content", workers=2), expected)
+
+    def test_frozen_results_pickle(self):
+        results = [ClassifierAgent().classify(content) for content in read_samples("*/*")]
+        results += [EmailAgent().process_email(email) for email in read_samples("emails/*.eml")]
+        for result in results:
+            self.assertEqual(pickle.loads(pickle.dumps(result)), result)
+
+if __name__ == "__main__":
+    unittest.main()